@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from calculate_solution import compute_full_sequence, compute_move_transition
+from utils import load_solution, save_solution, save_solutions, simplify_sequence, verify_solution
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STORAGE_FORMATS = (".json", ".hnb", ".db")
+_TRANSITION_SAMPLE = 2**16
+
+
+def classic_case(n):
+    '''
+    Input:
+        - n: the number of rings
+    Output:
+        - (name, rods, target) of the classic problem of n rings from rod 1 to rod 3
+    '''
+    return f"classic n={n}", {1: list(range(n, 0, -1)), 2: [], 3: []}, 3
+
+def custom_case(n, file = os.path.join(ROOT, "problems.json")):
+    '''
+    Input:
+        - n: the number of rings
+        - file: the JSON file's name to read the problems from
+    Output:
+        - (name, rods, target) of the largest problem of the file, scaled up to n rings by placing the missing
+          larger rings at the bottom of a rod other than the target, or None if the problem already has n rings or more
+    '''
+    with open(file, "r") as f:
+        problems = json.load(f)["problems"]
+    num, problem = max(problems.items(), key = lambda item: sum(len(rings) for rings in item[1]["initial_state"].values()))
+    rods = {rod: list(problem["initial_state"][str(rod)]) for rod in (1, 2, 3)}
+    target = problem["target"]
+    k = sum(len(rings) for rings in rods.values())
+    if k >= n:
+        return None
+    rod = 1 if target != 1 else 2
+    rods[rod] = list(range(n, k, -1)) + rods[rod]
+    return f"custom #{num} n={n}", rods, target
+
+def measure(func, repeat = 3, memory = True, setup = None):
+    '''
+    Input:
+        - func: the function to measure, called without arguments
+        - repeat: the number of timed calls (the best wall time is kept)
+        - memory: whether to make one more call under tracemalloc to measure the peak memory
+        - setup: a function called without arguments before every call, outside of the measurement
+    Output:
+        - (wall_time, peak_memory, result): the best wall time in seconds, the peak of the memory allocated during
+          the call in bytes (None if not measured) and the result of the last call
+    '''
+    wall_time = float("inf")
+    result = None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        result = func()
+        wall_time = min(wall_time, time.perf_counter() - start)
+    peak_memory = None
+    if memory:
+        if setup is not None:
+            setup()
+        result = None
+        tracemalloc.start()
+        try:
+            result = func()
+            peak_memory = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return wall_time, peak_memory, result
+
+def _quiet(func):
+    def wrapper():
+        with contextlib.redirect_stdout(io.StringIO()):
+            return func()
+    return wrapper
+
+def _record(results, key, moves, wall_time, peak_memory, verbose):
+    results[key] = {
+        "moves": moves,
+        "wall_time": wall_time,
+        "moves_per_s": moves / wall_time if wall_time > 0 else None,
+        "peak_memory": peak_memory
+    }
+    if verbose:
+        memory = "" if peak_memory is None else f", {peak_memory / 2**20:9.2f} MiB peak"
+        print(f"{key:<60} {moves:>10} moves, {wall_time:9.4f} s, {moves / max(wall_time, 1e-12):14.0f} moves/s{memory}")
+
+def run_benchmarks(ns, storage_sizes, repeat = 3, memory = True, verbose = True):
+    '''
+    Run the benchmarks of the solver, the simplifier, the verifier and the persistence layer.
+    Input:
+        - ns: the numbers of rings to sweep
+        - storage_sizes: the numbers of solutions already stored in the files that save_solution and
+          load_solution are measured on
+        - repeat: the number of timed calls of every benchmark
+        - memory: whether to measure the peak memory of every benchmark
+        - verbose: whether to print every result as it is measured
+    Output:
+        - a dictionary, in the form {"meta": {...}, "results": {<benchmark>: {"moves", "wall_time", "moves_per_s", "peak_memory"}}}
+    '''
+    results = {}
+    cases = [classic_case(n) for n in ns] + [case for case in map(custom_case, ns) if case is not None]
+    for name, rods, target in cases:
+        n = sum(len(rings) for rings in rods.values())
+        if name.startswith("classic"):
+            total = 2**n - 1
+            step = max(1, total // _TRANSITION_SAMPLE)
+            sample = range(1, total + 1, step)
+            wall_time, peak_memory, _ = measure(lambda: [compute_move_transition(n, 1, 3, m) for m in sample], repeat, memory)
+            _record(results, f"compute_move_transition[{name}]", len(sample), wall_time, peak_memory, verbose)
+        wall_time, peak_memory, seq = measure(lambda: compute_full_sequence(rods, target), repeat, memory)
+        _record(results, f"compute_full_sequence[{name}]", len(seq), wall_time, peak_memory, verbose)
+        wall_time, peak_memory, _ = measure(lambda: simplify_sequence(seq), repeat, memory)
+        _record(results, f"simplify_sequence[{name}]", len(seq), wall_time, peak_memory, verbose)
+        wall_time, peak_memory, _ = measure(lambda: verify_solution(rods, seq, target, verbose = False), repeat, memory)
+        _record(results, f"verify_solution[{name}]", len(seq), wall_time, peak_memory, verbose)
+    small_rods, small_target = classic_case(min(ns))[1:]
+    small_seq = compute_full_sequence(small_rods, small_target)
+    name, rods, target = classic_case(max(ns))
+    seq = compute_full_sequence(rods, target)
+    with tempfile.TemporaryDirectory() as directory:
+        for extension in STORAGE_FORMATS:
+            sizes = storage_sizes if extension != ".hnb" else [0]
+            for size in sizes:
+                file = os.path.join(directory, f"bench_{size}{extension}")
+                label = f"{name}, {size} stored" if extension != ".hnb" else name
+                def prefill():
+                    if os.path.exists(file):
+                        os.remove(file)
+                    if size:
+                        save_solutions([(small_rods, small_target, small_seq)] * size, file)
+                wall_time, peak_memory, _ = measure(_quiet(lambda: save_solution(rods, target, seq, file)), repeat, memory, _quiet(prefill))
+                _record(results, f"save_solution{extension}[{label}]", len(seq), wall_time, peak_memory, verbose)
+                wall_time, peak_memory, _ = measure(_quiet(lambda: load_solution(file, size + 1)), repeat, memory)
+                _record(results, f"load_solution{extension}[{label}]", len(seq), wall_time, peak_memory, verbose)
+                results[f"storage_size{extension}[{label}]"] = {"bytes": os.path.getsize(file)}
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "ns": list(ns),
+            "storage_sizes": list(storage_sizes),
+            "repeat": repeat
+        },
+        "results": results
+    }
+
+def compare_results(baseline, current, threshold = 0.1, min_time = 0.01, verbose = True):
+    '''
+    Input:
+        - baseline: the results of a previous run, as returned by run_benchmarks
+        - current: the results of the run to compare with the baseline
+        - threshold: the relative slowdown (or memory growth) above which a benchmark is a regression
+        - min_time: the wall time in seconds under which a benchmark is too short for its slowdown to be reliable,
+          so that it is reported but never counted as a regression
+        - verbose: whether to print the comparison of every benchmark
+    Output:
+        - the list of the regressions, as (benchmark, metric, baseline value, current value) tuples
+    '''
+    regressions = []
+    for key, result in current["results"].items():
+        base = baseline["results"].get(key)
+        if base is None:
+            continue
+        for metric in ("wall_time", "peak_memory", "bytes"):
+            old, new = base.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = new / old - 1
+            is_regression = change > threshold and (metric != "wall_time" or max(old, new) >= min_time)
+            if is_regression:
+                regressions.append((key, metric, old, new))
+            if verbose and (is_regression or metric == "wall_time"):
+                mark = "❌" if is_regression else "✅"
+                print(f"{mark} {key:<60} {metric:<12} {old:12.6g} -> {new:12.6g} ({change:+.1%})")
+    return regressions
+
+def _parse_ns(text):
+    if "-" in text:
+        start, stop = map(int, text.split("-"))
+        return list(range(start, stop + 1, 2))
+    return [int(text)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Tower of Hanoi Benchmarks")
+    parser.add_argument("-n", nargs = "+", default = ["10-20"],
+                        help = "The numbers of rings to sweep, as numbers or even-step ranges like 10-24 (default: 10-20).")
+    parser.add_argument("--storage", type = int, nargs = "+", default = [0, 10, 100],
+                        help = "The numbers of solutions already stored when saving and loading (default: 0 10 100).")
+    parser.add_argument("-r", "--repeat", type = int, default = 3, help = "The number of timed runs of every benchmark (the best is kept).")
+    parser.add_argument("--no-memory", action = "store_true", help = "Do not measure the peak memory (faster).")
+    parser.add_argument("-o", "--output", default = None, help = "The JSON file to save the results to (e.g. baseline.json).")
+    parser.add_argument("--compare", default = None, help = "A JSON file of previous results to compare with.")
+    parser.add_argument("--threshold", type = float, default = 0.1,
+                        help = "The relative slowdown or memory growth counted as a regression (default: 0.1).")
+    parser.add_argument("--min-time", type = float, default = 0.01,
+                        help = "The wall time in seconds under which slowdowns are not counted as regressions (default: 0.01).")
+    args = parser.parse_args()
+    ns = sorted({n for text in args.n for n in _parse_ns(text)})
+    current = run_benchmarks(ns, args.storage, args.repeat, not args.no_memory)
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(current, f, indent = 2)
+        print(f"✅ Results saved to {args.output}!")
+    if args.compare is not None:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)
+        print()
+        regressions = compare_results(baseline, current, args.threshold, args.min_time)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s) beyond {args.threshold:.0%}!")
+            sys.exit(1)
+        print(f"\n🎉 No regression beyond {args.threshold:.0%}!")
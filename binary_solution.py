@@ -0,0 +1,381 @@
+import mmap
+import struct
+import sys
+import zlib
+from array import array
+from functools import lru_cache
+
+
+BINARY_EXTENSION = ".hnb"
+_MAGIC = b"HNBS"
+_VERSION = 1
+_HEADER = struct.Struct("<4sBBHQI")
+_CHUNK = 2**16
+
+
+def pack_move(r, x, y):
+    '''
+    Input:
+        - r: the number of the ring that moves (up to 4095)
+        - x: the number of the rod from which the move starts
+        - y: the number of the rod to which the move ends
+    Output:
+        - the 16-bit record of the move: the ring number in the upper 12 bits, then 2 bits for x and 2 bits for y
+    '''
+    if not (0 < r < 4096 and 0 < x < 4 and 0 < y < 4):
+        raise ValueError(f"the move ({r}, {x}, {y}) cannot be packed: rings go from 1 to 4095 and rods from 1 to 3")
+    return (r << 4) | (x << 2) | y
+
+def unpack_move(record):
+    '''
+    Input:
+        - record: the 16-bit record of a move, as built by pack_move
+    Output:
+        - r, x, y: the ring number and the numbers of the start and end rods of the move
+    '''
+    return record >> 4, (record >> 2) & 3, record & 3
+
+def iter_packed_chunks(seq, chunk = _CHUNK):
+    '''
+    Input:
+        - seq: a dictionary, in the form {m1: [r1, x1, y1], m2: [r2, x2, y2], ...}, a MoveSequence, or an iterable of [r, x, y] moves
+        - chunk: the maximum number of moves per chunk
+    Output:
+        - a generator of arrays of 16-bit little-endian move records, of up to `chunk` moves each
+    '''
+    if isinstance(seq, MoveSequence):
+        for start in range(1, len(seq) + 1, chunk):
+            yield _little_endian(seq.records(start, start + chunk))
+        return
+    moves = (seq[m] for m in range(1, len(seq) + 1)) if isinstance(seq, dict) else seq
+    records = array("H")
+    for r, x, y in moves:
+        records.append(pack_move(r, x, y))
+        if len(records) == chunk:
+            yield _little_endian(records)
+            records = array("H")
+    if records:
+        yield _little_endian(records)
+
+def sequence_checksum(seq):
+    '''
+    Input:
+        - seq: a dictionary, in the form {m1: [r1, x1, y1], m2: [r2, x2, y2], ...}, a MoveSequence, or an iterable of [r, x, y] moves
+    Output:
+        - the CRC-32 of the packed little-endian move records of the sequence
+    '''
+    checksum = 0
+    for records in iter_packed_chunks(seq):
+        checksum = zlib.crc32(records, checksum)
+    return checksum
+
+@lru_cache(maxsize = None)
+def _relabel_table(labels):
+    '''
+    Input:
+        - labels: the new labels of the rods 1, 2 and 3, as a tuple
+    Output:
+        - the bytes.translate table mapping the low byte of a 16-bit record (the 4 low bits of the ring number, then
+          2 bits for x and 2 bits for y) to the low byte of the relabeled record
+    '''
+    labels = (0,) + labels
+    return bytes((byte & 0xF0) | (labels[(byte >> 2) & 3] << 2) | labels[byte & 3] for byte in range(256))
+
+def relabel_records(records, perm):
+    '''
+    Relabel the rods of packed moves, at the cost of two slice copies and a bytes.translate over the low bytes.
+    Input:
+        - records: the 16-bit little-endian records of the moves, as bytes
+        - perm: the relabeling of the rods, as a dictionary {rod: new rod}
+    Output:
+        - the relabeled records, as bytes
+    '''
+    labels = (perm[1], perm[2], perm[3])
+    if labels == (1, 2, 3):
+        return bytes(records)
+    relabeled = bytearray(records)
+    relabeled[0::2] = relabeled[0::2].translate(_relabel_table(labels))
+    return bytes(relabeled)
+
+def _little_endian(records):
+    if sys.byteorder != "little":
+        records.byteswap()
+    return records
+
+def _records_offset(n):
+    return (_HEADER.size + n + 7) // 8 * 8
+
+def save_binary_solution(rods, target, seq, file):
+    '''
+    Save a solution to the packed binary format: a header (magic, version, target rod, number of rings, number of
+    moves, CRC-32 of the records), the rod of every ring of the initial state, padding to 8 bytes, and then one
+    16-bit record per move (see pack_move).
+    Input:
+        - rods: a dictionary, in the form {1: <list>, 2: <list>, 3: <list>}
+            - 1: the initial state of the first (left) rod, represented as a list of rings ordered from bottom to top
+            - 2: the initial state of the second (middle) rod, represented as a list of rings ordered from bottom to top
+            - 3: the initial state of the third (right) rod, represented as a list of rings ordered from bottom to top
+        - target: the number of the target rod
+        - seq: a dictionary, in the form {m1: [r1, x1, y1], m2: [r2, x2, y2], ...}, or an iterable of [r, x, y] moves
+        - file: the binary file's name to save the solution to
+    Output:
+        - a boolean indicating whether the solution has been saved successfully
+    '''
+    try:
+        n = len(rods[1] + rods[2] + rods[3])
+        total_moves = 0
+        checksum = 0
+        with open(file, "wb") as f:
+            f.write(bytes(_records_offset(n)))
+            for records in iter_packed_chunks(seq):
+                f.write(records)
+                total_moves += len(records)
+                checksum = zlib.crc32(records, checksum)
+            _write_header(f, rods, target, total_moves, checksum)
+        print(f"✅ Solution saved to {file}!")
+        return True
+    except Exception as e:
+        print(f"❌ Failed to save solution: {e}!")
+        return False
+
+def allocate_binary_solution(rods, target, total_moves, file):
+    '''
+    Create a binary solution file with room for total_moves records, to be filled in place (e.g. by several processes
+    writing disjoint ranges of moves) and then sealed with update_binary_checksum.
+    Input:
+        - rods: a dictionary, in the form {1: <list>, 2: <list>, 3: <list>}
+        - target: the number of the target rod
+        - total_moves: the number of moves of the solution
+        - file: the binary file's name
+    Output:
+        - the offset in bytes of the record of move 1 (the record of move m is at offset + 2 * (m - 1))
+    '''
+    n = len(rods[1] + rods[2] + rods[3])
+    offset = _records_offset(n)
+    with open(file, "wb") as f:
+        _write_header(f, rods, target, total_moves, 0)
+        f.truncate(offset + 2 * total_moves)
+    return offset
+
+def update_binary_checksum(file):
+    '''
+    Compute the CRC-32 of the records of a binary solution file and store it in the header.
+    Input:
+        - file: the binary file's name
+    Output:
+        - the checksum
+    '''
+    with open(file, "r+b") as f:
+        magic, version, target, n, total_moves, checksum = _HEADER.unpack(f.read(_HEADER.size))
+        f.seek(_records_offset(n))
+        checksum = 0
+        for start in range(0, total_moves, _CHUNK):
+            checksum = zlib.crc32(f.read(2 * min(_CHUNK, total_moves - start)), checksum)
+        f.seek(0)
+        f.write(_HEADER.pack(magic, version, target, n, total_moves, checksum))
+    return checksum
+
+def _write_header(f, rods, target, total_moves, checksum):
+    n = len(rods[1] + rods[2] + rods[3])
+    rings_places = bytearray(n)
+    for rod in (1, 2, 3):
+        for j in rods[rod]:
+            rings_places[j - 1] = rod
+    f.seek(0)
+    f.write(_HEADER.pack(_MAGIC, _VERSION, target, n, total_moves, checksum))
+    f.write(rings_places)
+
+
+class BinarySolution:
+    '''
+    Read-only view of a solution saved with save_binary_solution. The file is memory-mapped, so opening it costs
+    no parsing, seq[m] decodes the single record of move m in O(1) and records() gives zero-copy slices.
+    Attributes:
+        - initial_state: a dictionary, in the form {1: <list>, 2: <list>, 3: <list>}
+        - target: the number of the target rod
+        - total_moves: the number of moves of the solution
+        - checksum: the CRC-32 of the move records, as stored in the header
+    '''
+    __slots__ = ("file", "initial_state", "target", "total_moves", "checksum", "_file", "_mmap", "_records")
+
+    def __init__(self, file):
+        self.file = file
+        self._file = open(file, "rb")
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access = mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f"{file} is not a binary solution file")
+        if len(self._mmap) < _HEADER.size:
+            self.close()
+            raise ValueError(f"{file} is not a binary solution file")
+        magic, version, self.target, n, self.total_moves, self.checksum = _HEADER.unpack_from(self._mmap)
+        if magic != _MAGIC or version != _VERSION:
+            self.close()
+            raise ValueError(f"{file} is not a binary solution file")
+        self.initial_state = {1: [], 2: [], 3: []}
+        for k in range(n, 0, -1):
+            self.initial_state[self._mmap[_HEADER.size + k - 1]].append(k)
+        offset = _records_offset(n)
+        self._records = memoryview(self._mmap)[offset:offset + 2 * self.total_moves].cast("H")
+
+    def __len__(self):
+        return self.total_moves
+
+    def __getitem__(self, m):
+        '''
+        Input:
+            - m: the number of the move (1 to total_moves, as the keys of the {m: [r, x, y]} dictionaries)
+        Output:
+            - [r, x, y]: the ring number and the numbers of the start and end rods of move m
+        '''
+        if not 1 <= m <= self.total_moves:
+            raise KeyError(m)
+        return list(unpack_move(self._record(self._records[m - 1])))
+
+    def __iter__(self):
+        for start in range(0, self.total_moves, _CHUNK):
+            for record in self._records[start:start + _CHUNK].tolist():
+                yield unpack_move(self._record(record))
+
+    def _record(self, record):
+        if sys.byteorder != "little":
+            return ((record & 0xFF) << 8) | (record >> 8)
+        return record
+
+    def records(self, m_start = 1, m_stop = None):
+        '''
+        Input:
+            - m_start: the number of the first move of the slice
+            - m_stop: the number of the move right after the last move of the slice (None for the end of the solution)
+        Output:
+            - a zero-copy memoryview of the 16-bit little-endian records of the moves m_start <= m < m_stop
+        '''
+        m_stop = self.total_moves + 1 if m_stop is None else m_stop
+        return self._records[max(0, m_start - 1):max(0, m_stop - 1)]
+
+    def verify_checksum(self):
+        '''
+        Output:
+            - a boolean indicating whether the move records match the checksum stored in the header
+        '''
+        return zlib.crc32(self._records) == self.checksum
+
+    def close(self):
+        if getattr(self, "_records", None) is not None:
+            self._records.release()
+            self._records = None
+        if getattr(self, "_mmap", None) is not None:
+            self._mmap.close()
+            self._mmap = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class MoveSequence:
+    '''
+    Moves sequence kept as packed 16-bit records (see pack_move) in an array, i.e. 2 bytes per move instead of the
+    dictionary entry, the key and the 3-element list of the {m: [r, x, y]} form, while giving the same access:
+    seq[m] is the [r, x, y] list of move m (1-based), and keys(), values(), items(), len() and `m in seq` behave as
+    with the dictionary. Iterating gives the (r, x, y) moves in order, and seq[m_start:m_stop] is the MoveSequence
+    of the moves m_start <= m < m_stop. Rings go from 1 to 4095 and rods from 1 to 3 (see pack_move).
+    '''
+    __slots__ = ("_records",)
+
+    def __init__(self, moves = ()):
+        '''
+        Input:
+            - moves: a dictionary, in the form {m1: [r1, x1, y1], m2: [r2, x2, y2], ...}, or an iterable of [r, x, y] moves
+        '''
+        if isinstance(moves, dict):
+            moves = map(moves.__getitem__, range(1, len(moves) + 1))
+        self._records = array("H", [pack_move(r, x, y) for r, x, y in moves])
+
+    @classmethod
+    def from_records(cls, records):
+        '''
+        Input:
+            - records: an array("H") of move records in native byte order (kept without copy), or 16-bit little-endian
+              records as bytes
+        Output:
+            - the MoveSequence of the records
+        '''
+        seq = cls.__new__(cls)
+        if isinstance(records, array):
+            seq._records = records
+        else:
+            seq._records = array("H", bytes(records))
+            if sys.byteorder != "little":
+                seq._records.byteswap()
+        return seq
+
+    def records(self, m_start = 1, m_stop = None):
+        '''
+        Input:
+            - m_start: the number of the first move of the slice
+            - m_stop: the number of the move right after the last move of the slice (None for the end of the sequence)
+        Output:
+            - an array("H") with the records of the moves m_start <= m < m_stop, in native byte order (the records of
+              the sequence themselves, without copy, for the whole sequence)
+        '''
+        if m_start == 1 and m_stop is None:
+            return self._records
+        m_stop = len(self._records) + 1 if m_stop is None else m_stop
+        return self._records[max(0, m_start - 1):max(0, m_stop - 1)]
+
+    def append(self, move):
+        self._records.append(pack_move(*move))
+
+    def extend(self, moves):
+        if isinstance(moves, MoveSequence):
+            self._records.extend(moves._records)
+        else:
+            self._records.extend([pack_move(r, x, y) for r, x, y in moves])
+
+    def __len__(self):
+        return len(self._records)
+
+    def __getitem__(self, m):
+        if isinstance(m, slice):
+            if m.step is not None:
+                raise ValueError("MoveSequence slices do not take a step")
+            if (m.start is not None and m.start < 1) or (m.stop is not None and m.stop < 1):
+                raise ValueError("MoveSequence slices take move numbers, from 1")
+            # Slicing the array copies the records, even for the whole sequence, so that the slice does not share them
+            return MoveSequence.from_records(self._records[0 if m.start is None else m.start - 1:None if m.stop is None else m.stop - 1])
+        if not 1 <= m <= len(self._records):
+            raise KeyError(m)
+        record = self._records[m - 1]
+        return [record >> 4, (record >> 2) & 3, record & 3]
+
+    def __iter__(self):
+        for start in range(0, len(self._records), _CHUNK):
+            for record in self._records[start:start + _CHUNK]:
+                yield record >> 4, (record >> 2) & 3, record & 3
+
+    def __contains__(self, m):
+        return isinstance(m, int) and 1 <= m <= len(self._records)
+
+    def keys(self):
+        return range(1, len(self._records) + 1)
+
+    def values(self):
+        return ([r, x, y] for r, x, y in self)
+
+    def items(self):
+        return zip(self.keys(), self.values())
+
+    def __eq__(self, other):
+        if isinstance(other, MoveSequence):
+            return self._records == other._records
+        if isinstance(other, dict):
+            return len(other) == len(self) and all(other.get(m) == move for m, move in self.items())
+        return NotImplemented
+
+    def __repr__(self):
+        return f"MoveSequence({len(self)} moves)"
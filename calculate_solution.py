@@ -1,63 +1,574 @@
-from utils import simplify_sequence
-
-
-def compute_move_transition(n, s, f, m):
-    '''
-    Input:
-        - n: the total number of rings
-        - s: the number of the starting rod
-        - f: the number of the final rod
-        - m: the number of the move of which I want to calculate the associated transition (xm, ym)
-    Output:
-        - r: the number of the ring that moves during the transition
-        - x: the number of the rod from which the transition of move m starts
-        - y: the number of the rod to which the transition of move m ends
-    Other variables:
-        - d: the moving direction of the rings (-1 for going left and +1 for going right)
-        - k: the number of transitions right before move m, that happened using the r ring
-    '''
-    r = ((2 * m) & -(2 * m)).bit_length() - 1
-    d = (-1)**(n % 2 + (f - s) % 3)
-    k = m / 2**r - 0.5
-    x = 1 + (s + d * k * (2 - r % 2) - 1) % 3
-    y = 1 + (x + d * (2 - r % 2) - 1) % 3
-    return r, x, y
-
-def compute_full_sequence(rods, target):
-    '''
-    Input:
-        - rods: a dictionary, in the form {1: <list>, 2: <list>, 3: <list>}
-            - 1: the initial state of the first (left) rod, represented as a list of rings ordered from bottom to top
-            - 2: the initial state of the second (middle) rod, represented as a list of rings ordered from bottom to top
-            - 3: the initial state of the third (right) rod, represented as a list of rings ordered from bottom to top
-        - target: the number of the target rod
-    Output:
-        - seq: a dictionary, in the form {m1: [r1, x1, y1], m2: [r2, x2, y2], ...}
-            - m: the number of the move
-            - r: the number of the ring that moves during the transition of move m
-            - x: the number of the rod from which the transition of move m starts
-            - y: the number of the rod to which the transition of move m ends
-    '''
-    n = len(rods[1] + rods[2] + rods[3])
-    rings_places = n * [0]
-    for i, rod in enumerate(list(rods.values())):
-        for j in rod:
-            rings_places[j - 1] = i + 1
-    seq = {}
-    move = 0
-    for k in range(1, n + 1):
-        for m in range(1, 2**k):
-            move += 1
-            if k != n:
-                if rings_places[k-1] != rings_places[k]:
-                    r, x, y = compute_move_transition(k, rings_places[k-1], rings_places[k], m)
-                else:
-                    break
-            else:
-                if rings_places[k-1] != target:
-                    r, x, y = compute_move_transition(k, rings_places[k-1], target, m)
-                else:
-                    break
-            seq[move] = [int(r), int(x), int(y)]
-    seq = simplify_sequence(seq)
-    return seq
+import sys
+import zlib
+from array import array
+from functools import lru_cache
+import instrumentation
+from binary_solution import MoveSequence, pack_move, relabel_records, unpack_move
+
+
+TEMPLATE_MAX_RINGS = 16
+# Version of the moves generated by the solver, stored with the recipes of the solutions (see SolutionRecipe): it must
+# be increased whenever the moves given by compute_full_sequence for a problem change
+SOLVER_VERSION = 1
+
+
+def compute_move_transition(n, s, f, m):
+    '''
+    Input:
+        - n: the total number of rings
+        - s: the number of the starting rod
+        - f: the number of the final rod
+        - m: the number of the move of which I want to calculate the associated transition (xm, ym)
+    Output:
+        - r: the number of the ring that moves during the transition
+        - x: the number of the rod from which the transition of move m starts
+        - y: the number of the rod to which the transition of move m ends
+    Other variables:
+        - d: the moving direction of the rings (-1 for going left and +1 for going right)
+        - k: the number of transitions right before move m, that happened using the r ring
+    All the operations are exact on Python integers (m = 2**(r-1) * (2*k + 1), so k is m shifted right by r bits),
+    which keeps the result correct for any number of rings and any move number, at a cost of O(log m) bit operations.
+    '''
+    r = (m & -m).bit_length()
+    d = -1 if (n % 2 + (f - s) % 3) % 2 else 1
+    k = m >> r
+    x = 1 + (s + d * k * (2 - r % 2) - 1) % 3
+    y = 1 + (x + d * (2 - r % 2) - 1) % 3
+    return r, x, y
+
+def compute_move_batch(n, s, f, m_start, m_stop):
+    '''
+    Compute the transitions of all the moves m_start <= m < m_stop at once, using only integer arithmetic.
+    The ring r moves at the moves m = 2**(r-1) * (2*k + 1), so the moves of every ring form an arithmetic progression
+    and its rods repeat with period 3 in k; each ring is therefore written with a single strided slice assignment.
+    Input:
+        - n: the total number of rings
+        - s: the number of the starting rod
+        - f: the number of the final rod
+        - m_start: the number of the first move of the range (moves before 1 are ignored)
+        - m_stop: the number of the move right after the last move of the range (moves after 2**n - 1 are ignored)
+    Output:
+        - rings: an array with the number of the ring that moves during each move of the range
+        - xs: an array with the number of the rod from which each move of the range starts
+        - ys: an array with the number of the rod to which each move of the range ends
+    '''
+    length = max(0, min(m_stop, 2**n) - max(1, m_start))
+    rings = array(_ring_typecode(n), [0]) * length
+    xs = array("B", [0]) * length
+    ys = array("B", [0]) * length
+    for r, i0, step, count, x_cycle, y_cycle in _iter_ring_progressions(n, s, f, m_start, m_stop):
+        repeats = count // 3 + 1
+        rings[i0::step] = array(rings.typecode, [r]) * count
+        xs[i0::step] = (array("B", x_cycle) * repeats)[:count]
+        ys[i0::step] = (array("B", y_cycle) * repeats)[:count]
+    return rings, xs, ys
+
+def compute_record_batch(n, s, f, m_start, m_stop):
+    '''
+    Same as compute_move_batch, with every move packed in a 16-bit record (see binary_solution.pack_move).
+    Input:
+        - n: the total number of rings (up to 4095)
+        - s: the number of the starting rod
+        - f: the number of the final rod
+        - m_start: the number of the first move of the range (moves before 1 are ignored)
+        - m_stop: the number of the move right after the last move of the range (moves after 2**n - 1 are ignored)
+    Output:
+        - records: an array("H") with the record of each move of the range, in native byte order
+    '''
+    length = max(0, min(m_stop, 2**n) - max(1, m_start))
+    records = array("H", [0]) * length
+    for r, i0, step, count, x_cycle, y_cycle in _iter_ring_progressions(n, s, f, m_start, m_stop):
+        cycle = array("H", [pack_move(r, x, y) for x, y in zip(x_cycle, y_cycle)])
+        records[i0::step] = (cycle * (count // 3 + 1))[:count]
+    return records
+
+def iter_classic_records(n, s, f):
+    '''
+    Compose the classic solution of n rings by copying blocks instead of computing its moves one by one: the solution
+    from s to f is the (n-1)-ring solution from s to the spare rod, the move of ring n, and the (n-1)-ring solution from
+    the spare rod to f, and every (n-1)-ring solution is the cached template from rod 1 to rod 3 with its rods relabeled
+    (see binary_solution.relabel_records). Templates are cached up to TEMPLATE_MAX_RINGS rings, so that the larger
+    solutions are handed out as a sequence of blocks of 2**TEMPLATE_MAX_RINGS - 1 moves.
+    Input:
+        - n: the total number of rings (up to 4095)
+        - s: the number of the starting rod
+        - f: the number of the final rod
+    Output:
+        - a generator of bytes blocks of 16-bit little-endian move records (see binary_solution.pack_move), which
+          joined together give the 2**n - 1 moves of the solution
+    '''
+    if n <= TEMPLATE_MAX_RINGS:
+        if n > 0:
+            yield _classic_template(n, s, f)
+        return
+    spare = 6 - s - f
+    yield from iter_classic_records(n - 1, s, spare)
+    yield pack_move(n, s, f).to_bytes(2, "little")
+    yield from iter_classic_records(n - 1, spare, f)
+
+@lru_cache(maxsize = 32)
+def _classic_template(n, s, f):
+    '''
+    Input:
+        - n: the total number of rings (up to TEMPLATE_MAX_RINGS)
+        - s: the number of the starting rod
+        - f: the number of the final rod
+    Output:
+        - the 16-bit little-endian records of the classic solution, as bytes, built from the two (n-1)-ring templates
+          or, for a pair of rods other than (1, 3), relabeled from the template from rod 1 to rod 3
+    '''
+    if n == 0:
+        return b""
+    if (s, f) != (1, 3):
+        return relabel_records(_classic_template(n, 1, 3), {1: s, 2: 6 - s - f, 3: f})
+    return _classic_template(n - 1, 1, 2) + pack_move(n, 1, 3).to_bytes(2, "little") + _classic_template(n - 1, 2, 3)
+
+def _iter_ring_progressions(n, s, f, m_start, m_stop):
+    '''
+    Input:
+        - n, s, f, m_start, m_stop: as in compute_move_batch
+    Output:
+        - a generator of (r, i0, step, count, x_cycle, y_cycle) for every ring r that moves in the range: its moves are
+          at the positions i0, i0 + step, ... (count of them) of the range, and their start and end rods repeat the
+          3 values of x_cycle and y_cycle
+    '''
+    m_start = max(1, m_start)
+    m_stop = min(m_stop, 2**n)
+    length = m_stop - m_start
+    if length <= 0:
+        return
+    d = -1 if (n % 2 + (f - s) % 3) % 2 else 1
+    for r in range(1, (m_stop - 1).bit_length() + 1):
+        half = 1 << (r - 1)
+        step = 1 << r
+        k0 = max(0, (m_start - half + step - 1) >> r)
+        i0 = half + k0 * step - m_start
+        if i0 >= length:
+            continue
+        count = (length - i0 + step - 1) >> r
+        jump = d * (2 - r % 2)
+        x_cycle = [1 + (s - 1 + jump * (k0 + j)) % 3 for j in range(3)]
+        y_cycle = [1 + (x - 1 + jump) % 3 for x in x_cycle]
+        yield r, i0, step, count, x_cycle, y_cycle
+
+def _ring_typecode(n):
+    '''
+    Input:
+        - n: the total number of rings
+    Output:
+        - the smallest unsigned array typecode able to hold the ring numbers 1, ..., n
+    '''
+    if n < 2**8:
+        return "B"
+    if n < 2**16:
+        return "H"
+    return "L"
+
+def state_at_move(n, s, f, m):
+    '''
+    Compute the rods state of the classic game right after move m, without replaying the previous moves.
+    Going from the largest ring to the smallest one, ring k is still on its source rod if m < 2**(k-1), otherwise
+    it has already been moved to its final rod and the remaining m - 2**(k-1) moves belong to the second half.
+    Input:
+        - n: the total number of rings
+        - s: the number of the starting rod
+        - f: the number of the final rod
+        - m: the number of moves played (0 for the initial state, up to 2**n - 1 for the final state)
+    Output:
+        - rods: a dictionary, in the form {1: <list>, 2: <list>, 3: <list>}
+            - 1: the state of the first (left) rod, represented as a list of rings ordered from bottom to top
+            - 2: the state of the second (middle) rod, represented as a list of rings ordered from bottom to top
+            - 3: the state of the third (right) rod, represented as a list of rings ordered from bottom to top
+    '''
+    if not 0 <= m <= (1 << n) - 1:
+        raise ValueError(f"the number of moves played must be between 0 and {(1 << n) - 1}, not {m}")
+    rods = {1: [], 2: [], 3: []}
+    source, final = s, f
+    for k in range(n, 0, -1):
+        spare = 6 - source - final
+        if m >> (k - 1):
+            rods[final].append(k)
+            m -= 1 << (k - 1)
+            source = spare
+        else:
+            rods[source].append(k)
+            final = spare
+    return rods
+
+def move_index_of_state(rods, s, f):
+    '''
+    Inverse of state_at_move: find after which move of the classic game the given rods state shows up.
+    Input:
+        - rods: a dictionary, in the form {1: <list>, 2: <list>, 3: <list>}
+            - 1: the state of the first (left) rod, represented as a list of rings ordered from bottom to top
+            - 2: the state of the second (middle) rod, represented as a list of rings ordered from bottom to top
+            - 3: the state of the third (right) rod, represented as a list of rings ordered from bottom to top
+        - s: the number of the starting rod
+        - f: the number of the final rod
+    Output:
+        - m: the number of moves played to reach the state (0 for the initial state), or None if the state is not
+          part of the optimal game from rod s to rod f
+    '''
+    n = len(rods[1] + rods[2] + rods[3])
+    rings_places = n * [0]
+    for rod, rings in rods.items():
+        for j in rings:
+            rings_places[j - 1] = rod
+    m = 0
+    source, final = s, f
+    for k in range(n, 0, -1):
+        spare = 6 - source - final
+        if rings_places[k-1] == final:
+            m += 1 << (k - 1)
+            source = spare
+        elif rings_places[k-1] == source:
+            final = spare
+        else:
+            return None
+    return m
+
+def compute_optimal_blocks(rods, target):
+    '''
+    Decompose the optimal solution from any regular rods state into blocks, using the largest misplaced ring.
+    To gather rings 1, ..., k on rod t, ring k stays if it is already on t; otherwise rings 1, ..., k-1 are first
+    gathered on the spare rod c, ring k moves from its rod p to t, and rings 1, ..., k-1 move from c to t with the
+    classic solution. Going from ring n down to ring 1 gives every misplaced ring k its (p, t, c), and the solution
+    is played from the smallest block to the largest one.
+    Input:
+        - rods: a dictionary, in the form {1: <list>, 2: <list>, 3: <list>}
+            - 1: the initial state of the first (left) rod, represented as a list of rings ordered from bottom to top
+            - 2: the initial state of the second (middle) rod, represented as a list of rings ordered from bottom to top
+            - 3: the initial state of the third (right) rod, represented as a list of rings ordered from bottom to top
+        - target: the number of the target rod
+    Output:
+        - blocks: a list of tuples (k, p, t, c), ordered by increasing ring k, each one standing for the 2**(k-1) moves
+          "ring k from rod p to rod t, then the classic solution of k-1 rings from rod c to rod t"
+    '''
+    n = len(rods[1] + rods[2] + rods[3])
+    rings_places = n * [0]
+    for rod, rings in rods.items():
+        for j in rings:
+            rings_places[j - 1] = rod
+    blocks = []
+    for k in range(n, 0, -1):
+        p = rings_places[k-1]
+        if p != target:
+            spare = 6 - p - target
+            blocks.append((k, p, target, spare))
+            target = spare
+    blocks.reverse()
+    return blocks
+
+def count_optimal_moves(rods, target):
+    '''
+    Input:
+        - rods: a dictionary, in the form {1: <list>, 2: <list>, 3: <list>}
+            - 1: the initial state of the first (left) rod, represented as a list of rings ordered from bottom to top
+            - 2: the initial state of the second (middle) rod, represented as a list of rings ordered from bottom to top
+            - 3: the initial state of the third (right) rod, represented as a list of rings ordered from bottom to top
+        - target: the number of the target rod
+    Output:
+        - the number of moves of the optimal solution, computed in O(n) without generating the moves
+    '''
+    return sum(1 << (k - 1) for k, p, t, c in compute_optimal_blocks(rods, target))
+
+@instrumentation.stage("compute_full_sequence")
+def compute_full_sequence(rods, target):
+    '''
+    Input:
+        - rods: a dictionary, in the form {1: <list>, 2: <list>, 3: <list>}
+            - 1: the initial state of the first (left) rod, represented as a list of rings ordered from bottom to top
+            - 2: the initial state of the second (middle) rod, represented as a list of rings ordered from bottom to top
+            - 3: the initial state of the third (right) rod, represented as a list of rings ordered from bottom to top
+        - target: the number of the target rod
+    Output:
+        - seq: a dictionary, in the form {m1: [r1, x1, y1], m2: [r2, x2, y2], ...}
+            - m: the number of the move
+            - r: the number of the ring that moves during the transition of move m
+            - x: the number of the rod from which the transition of move m starts
+            - y: the number of the rod to which the transition of move m ends
+          kept as a binary_solution.MoveSequence, which gives the same seq[m] access with 2 bytes per move
+    '''
+    seq = MoveSequence.from_records(compute_full_records(rods, target))
+    if instrumentation.is_enabled():
+        instrumentation.count("compute_full_sequence", moves = len(seq))
+    return seq
+
+def compute_full_records(rods, target):
+    '''
+    Same as compute_full_sequence, with every move packed in a 16-bit record (see binary_solution.pack_move), which
+    takes 2 bytes per move and is built block by block from the templates of iter_classic_records.
+    Input:
+        - rods: a dictionary, in the form {1: <list>, 2: <list>, 3: <list>}
+        - target: the number of the target rod
+    Output:
+        - records: an array("H") with the record of each move of the solution, in native byte order
+    '''
+    records = array("H")
+    for k, p, t, c in compute_optimal_blocks(rods, target):
+        records.append(pack_move(k, p, t))
+        start = len(records)
+        for block in iter_classic_records(k - 1, c, t):
+            records.frombytes(block)
+        if sys.byteorder != "little":
+            records[start:] = _byteswapped(records[start:])
+    return records
+
+def full_sequence_checksum(rods, target):
+    '''
+    Same as binary_solution.sequence_checksum(compute_full_sequence(rods, target)), computed from the blocks of
+    compute_optimal_blocks and iter_classic_records without unpacking the moves.
+    Input:
+        - rods: a dictionary, in the form {1: <list>, 2: <list>, 3: <list>}
+        - target: the number of the target rod
+    Output:
+        - the CRC-32 of the packed little-endian move records of the optimal solution
+    '''
+    checksum = 0
+    for k, p, t, c in compute_optimal_blocks(rods, target):
+        checksum = zlib.crc32(pack_move(k, p, t).to_bytes(2, "little"), checksum)
+        for block in iter_classic_records(k - 1, c, t):
+            checksum = zlib.crc32(block, checksum)
+    return checksum
+
+def _byteswapped(records):
+    records.byteswap()
+    return records
+
+def iter_full_sequence(rods, target, m_start = 1, m_stop = None, chunk = 2**16):
+    '''
+    Streaming version of compute_full_sequence: the moves of the optimal solution are generated directly from the
+    blocks of compute_optimal_blocks and handed out one at a time, with memory independent of the total number of moves.
+    A range of moves can be asked for, in which case the blocks before it are skipped without generating their moves.
+    Input:
+        - rods: a dictionary, in the form {1: <list>, 2: <list>, 3: <list>}
+            - 1: the initial state of the first (left) rod, represented as a list of rings ordered from bottom to top
+            - 2: the initial state of the second (middle) rod, represented as a list of rings ordered from bottom to top
+            - 3: the initial state of the third (right) rod, represented as a list of rings ordered from bottom to top
+        - target: the number of the target rod
+        - m_start: the number of the first move to generate
+        - m_stop: the number of the move right after the last move to generate (None for the end of the solution)
+        - chunk: the number of moves computed at once by compute_move_batch
+    Output:
+        - a generator of the (r, x, y) moves m_start <= m < m_stop of the solution
+    '''
+    block_start = 1
+    for k, p, t, c in compute_optimal_blocks(rods, target):
+        # The block starts with the move of ring k, followed by the classic moves 1, ..., 2**(k-1) - 1 of rings 1, ..., k-1
+        size = 1 << (k - 1)
+        if m_stop is not None and block_start >= m_stop:
+            return
+        if block_start + size > m_start:
+            if block_start >= m_start:
+                yield k, p, t
+            first = max(1, m_start - block_start)
+            last = size if m_stop is None else min(size, m_stop - block_start)
+            yield from _iter_classic_moves(k - 1, c, t, first, last, chunk)
+        block_start += size
+
+def _iter_classic_moves(n, s, f, m_start = 1, m_stop = None, chunk = 2**16):
+    '''
+    Input:
+        - n, s, f: as in compute_move_batch
+        - m_start, m_stop: the range of moves to generate (None for the end of the solution)
+        - chunk: the number of moves computed at once by compute_move_batch
+    Output:
+        - a generator of the (r, x, y) moves m_start <= m < m_stop of the classic solution
+    '''
+    m_stop = 2**n if m_stop is None else min(m_stop, 2**n)
+    if n <= TEMPLATE_MAX_RINGS and m_start < m_stop:
+        # Small classic solutions are cached as templates, only their records have to be unpacked
+        records = array("H", _classic_template(n, s, f))
+        if sys.byteorder != "little":
+            records.byteswap()
+        yield from map(unpack_move, records[m_start - 1:m_stop - 1])
+        return
+    for classic_start in range(m_start, m_stop, chunk):
+        yield from zip(*compute_move_batch(n, s, f, classic_start, min(classic_start + chunk, m_stop)))
+
+def _rings_places(rods):
+    '''
+    Input:
+        - rods: a dictionary, in the form {1: <list>, 2: <list>, 3: <list>}
+    Output:
+        - a list with the rod of every ring 1, ..., n, at index ring - 1
+    '''
+    rings_places = sum(len(rings) for rings in rods.values()) * [0]
+    for rod, rings in rods.items():
+        for j in rings:
+            rings_places[j - 1] = rod
+    return rings_places
+
+def _gather_moves(rings_places, k, t):
+    '''
+    Output:
+        - the number of moves of the optimal solution gathering rings 1, ..., k of the given places on rod t
+    '''
+    moves = 0
+    for j in range(k, 0, -1):
+        p = rings_places[j - 1]
+        if p != t:
+            moves += 1 << (j - 1)
+            t = 6 - p - t
+    return moves
+
+def _path_plan(rods_from, rods_to):
+    '''
+    Find the shortest path between two regular states. The rings larger than the largest ring k placed differently
+    never move. Ring k moves either once, from its rod p to its rod q, after the smaller rings have gathered on the
+    third rod r, or twice, from p to r and then from r to q, with the smaller rings gathered on q, moved to p in
+    between with the classic solution, and then spread from p to their final places; the shortest of the two is taken.
+    Output:
+        - (moves, k, plan): the number of moves of the shortest path (None if the states do not have the same rings),
+          the largest misplaced ring (0 if the states are the same) and the rods (p, q, r, two_moves) of the chosen option
+    '''
+    places_from, places_to = _rings_places(rods_from), _rings_places(rods_to)
+    if len(places_from) != len(places_to):
+        print("❌ The two states must have the same rings!")
+        return None, 0, None
+    k = len(places_from)
+    while k > 0 and places_from[k - 1] == places_to[k - 1]:
+        k -= 1
+    if k == 0:
+        return 0, 0, None
+    p, q = places_from[k - 1], places_to[k - 1]
+    r = 6 - p - q
+    one_move = _gather_moves(places_from, k - 1, r) + 1 + _gather_moves(places_to, k - 1, r)
+    two_moves = _gather_moves(places_from, k - 1, q) + (1 << (k - 1)) + 1 + _gather_moves(places_to, k - 1, p)
+    if two_moves < one_move:
+        return two_moves, k, (p, q, r, True)
+    return one_move, k, (p, q, r, False)
+
+def min_moves(rods_from, rods_to):
+    '''
+    Compute the length of the shortest path between any two regular states of the same rings, in O(n) and without
+    generating the moves (the end state does not need to have all the rings on one rod).
+    Input:
+        - rods_from: the starting state, as a dictionary in the form {1: <list>, 2: <list>, 3: <list>}
+        - rods_to: the final state, as a dictionary in the form {1: <list>, 2: <list>, 3: <list>}
+    Output:
+        - the number of moves of the shortest path from rods_from to rods_to, or None if the states do not have the same rings
+    '''
+    return _path_plan(rods_from, rods_to)[0]
+
+def iter_path(rods_from, rods_to):
+    '''
+    Generate the moves of the shortest path between two regular states (see min_moves). Spreading the smaller rings
+    from one rod to their final places is the optimal gathering of the final state played backwards, so it is
+    generated lazily from the blocks of compute_optimal_blocks taken in reverse order, each one reversed.
+    Input:
+        - rods_from: the starting state, as a dictionary in the form {1: <list>, 2: <list>, 3: <list>}
+        - rods_to: the final state, as a dictionary in the form {1: <list>, 2: <list>, 3: <list>}
+    Output:
+        - a generator of the (r, x, y) moves of the path
+    '''
+    moves, k, plan = _path_plan(rods_from, rods_to)
+    if k == 0:
+        return
+    p, q, r, two_moves = plan
+    smaller_from = {rod: [j for j in rings if j < k] for rod, rings in rods_from.items()}
+    smaller_to = {rod: [j for j in rings if j < k] for rod, rings in rods_to.items()}
+    if two_moves:
+        yield from iter_full_sequence(smaller_from, q)
+        yield k, p, r
+        yield from _iter_classic_moves(k - 1, q, p)
+        yield k, r, q
+        gathered = p
+    else:
+        yield from iter_full_sequence(smaller_from, r)
+        yield k, p, q
+        gathered = r
+    for j, p_j, t_j, c_j in reversed(compute_optimal_blocks(smaller_to, gathered)):
+        # Backwards, the block is the classic solution of j-1 rings from t_j to c_j, then ring j from t_j to p_j
+        yield from _iter_classic_moves(j - 1, t_j, c_j)
+        yield j, t_j, p_j
+
+
+class SolutionRecipe:
+    '''
+    Optimal solution kept as its recipe, i.e. the problem it solves, the version of the solver (see SOLVER_VERSION)
+    and the checksum of its moves, instead of the moves themselves: they are generated again by iter_full_sequence
+    when they are read, in full or by range. It gives the same access as the {m: [r, x, y]} dictionaries and
+    binary_solution.MoveSequence (seq[m], len(), iteration, keys(), items() and seq[m_start:m_stop]).
+    Attributes:
+        - initial_state: the rods state of the problem, in the form {1: <list>, 2: <list>, 3: <list>}
+        - target: the number of the target rod
+        - version: the version of the solver the recipe was made with
+        - checksum: the CRC-32 of the packed moves (see binary_solution.sequence_checksum)
+        - total_moves: the number of moves of the solution
+    '''
+    __slots__ = ("initial_state", "target", "version", "checksum", "total_moves")
+
+    def __init__(self, rods, target, checksum = None, version = SOLVER_VERSION, total_moves = None):
+        '''
+        Input:
+            - rods: a dictionary, in the form {1: <list>, 2: <list>, 3: <list>}
+            - target: the number of the target rod
+            - checksum: the checksum of the moves (computed with full_sequence_checksum, if not given)
+            - version: the version of the solver the recipe was made with
+            - total_moves: the number of moves of the solution (computed with count_optimal_moves, if not given)
+        '''
+        self.initial_state = rods
+        self.target = target
+        self.version = version
+        self.checksum = full_sequence_checksum(rods, target) if checksum is None else checksum
+        self.total_moves = count_optimal_moves(rods, target) if total_moves is None else total_moves
+
+    def to_json(self):
+        '''
+        Output:
+            - the recipe as stored in the solutions files, in the form {"solver": ..., "version": ..., "checksum": ...}
+        '''
+        return {"solver": "compute_full_sequence", "version": self.version, "checksum": self.checksum}
+
+    def is_intact(self):
+        '''
+        Output:
+            - a boolean indicating whether the moves generated by the current solver match the checksum of the recipe
+        '''
+        return self.version == SOLVER_VERSION and full_sequence_checksum(self.initial_state, self.target) == self.checksum
+
+    def moves(self, m_start = 1, m_stop = None):
+        '''
+        Input:
+            - m_start, m_stop: the range of moves to generate, as in iter_full_sequence
+        Output:
+            - a generator of the (r, x, y) moves m_start <= m < m_stop of the solution
+        '''
+        return iter_full_sequence(self.initial_state, self.target, m_start, m_stop)
+
+    def expand(self):
+        '''
+        Output:
+            - the binary_solution.MoveSequence of all the moves of the solution
+        '''
+        return MoveSequence.from_records(compute_full_records(self.initial_state, self.target))
+
+    def __len__(self):
+        return self.total_moves
+
+    def __getitem__(self, m):
+        if isinstance(m, slice):
+            if m.step is not None:
+                raise ValueError("SolutionRecipe slices do not take a step")
+            if (m.start is not None and m.start < 1) or (m.stop is not None and m.stop < 1):
+                raise ValueError("SolutionRecipe slices take move numbers, from 1")
+            return MoveSequence(self.moves(1 if m.start is None else m.start, m.stop))
+        if not 1 <= m <= self.total_moves:
+            raise KeyError(m)
+        return list(next(self.moves(m, m + 1)))
+
+    def __iter__(self):
+        return self.moves()
+
+    def keys(self):
+        return range(1, self.total_moves + 1)
+
+    def values(self):
+        return ([r, x, y] for r, x, y in self)
+
+    def items(self):
+        return zip(self.keys(), self.values())
+
+    def __repr__(self):
+        return f"SolutionRecipe({self.total_moves} moves, version {self.version}, checksum {self.checksum:#010x})"
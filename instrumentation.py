@@ -0,0 +1,187 @@
+import atexit
+import cProfile
+import json
+import os
+import sys
+import time
+from functools import wraps
+from itertools import islice
+
+
+ENV_VAR = "HANOI_PROFILE"
+CPROFILE_ENV_VAR = "HANOI_CPROFILE"
+
+_enabled = False
+_stages = {}
+# The names of the stages being run, the innermost one last
+_active = []
+_report_file = None
+_profiler = None
+_profile_file = None
+_registered = False
+
+
+def enable(report_file = None, profile_file = None):
+    '''
+    Start recording the stages of the solve pipeline; the report is written when the program exits.
+    Input:
+        - report_file: the JSON file's name to write the report to (the standard error, if not given)
+        - profile_file: the file's name to dump the cProfile statistics to (no cProfile, if not given)
+    '''
+    global _enabled, _report_file, _profiler, _profile_file, _registered
+    _enabled = True
+    _report_file = report_file
+    if profile_file is not None and _profiler is None:
+        _profile_file = profile_file
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+    if not _registered:
+        atexit.register(write_report)
+        _registered = True
+
+def enable_from_args(args):
+    '''
+    Enable the instrumentation from the command line arguments of a script, for the scripts that parse sys.argv
+    by hand: --profile writes the report to the standard error, --profile=FILE to FILE, and --cprofile=FILE dumps
+    the cProfile statistics to FILE.
+    Input:
+        - args: the list of the command line arguments
+    Output:
+        - the list of the other arguments
+    '''
+    report_file = profile_file = None
+    is_requested = False
+    other_args = []
+    for arg in args:
+        if arg == "--profile" or arg.startswith("--profile="):
+            is_requested = True
+            report_file = arg.partition("=")[2] or None
+        elif arg.startswith("--cprofile="):
+            is_requested = True
+            profile_file = arg.partition("=")[2]
+        else:
+            other_args.append(arg)
+    if is_requested:
+        enable(report_file, profile_file)
+    return other_args
+
+def disable():
+    '''
+    Stop recording the stages (the ones recorded so far are kept until reset is called).
+    '''
+    global _enabled, _profiler
+    _enabled = False
+    if _profiler is not None:
+        _profiler.disable()
+        _profiler.dump_stats(_profile_file)
+        _profiler = None
+
+def is_enabled():
+    return _enabled
+
+def reset():
+    '''
+    Forget all the recorded stages.
+    '''
+    _stages.clear()
+
+def stage(name):
+    '''
+    Decorator recording the number of calls and the wall time of a stage of the pipeline. When the instrumentation
+    is disabled, the wrapper only checks a flag before calling the function.
+    Input:
+        - name: the name of the stage in the report
+    '''
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            _active.append(name)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _active.pop()
+                record = _stage_record(name)
+                record["calls"] += 1
+                record["wall_time"] += time.perf_counter() - start
+        return wrapper
+    return decorator
+
+def stage_iter(name, iterable, batch = 2**12):
+    '''
+    Record the time spent producing the items of a lazy iterable (e.g. a generator of moves) as a stage of its own,
+    counting the items as its moves, and subtract it from the stages that consume the items, which would otherwise
+    include it. The items are pulled `batch` at a time, so that the timing costs little per item.
+    Input:
+        - name: the name of the stage in the report
+        - iterable: the iterable to time
+        - batch: the number of items produced at once
+    Output:
+        - a generator of the items of iterable
+    '''
+    record = _stage_record(name)
+    record["calls"] += 1
+    record.setdefault("moves", 0)
+    iterator = iter(iterable)
+    while True:
+        start = time.perf_counter()
+        items = list(islice(iterator, batch))
+        elapsed = time.perf_counter() - start
+        record["wall_time"] += elapsed
+        record["moves"] += len(items)
+        for consumer in set(_active):
+            _stage_record(consumer)["wall_time"] -= elapsed
+        if not items:
+            return
+        yield from items
+
+def count(name, **counters):
+    '''
+    Add to the counters of a stage (e.g. moves, moves_merged, bytes_written). Callers check is_enabled() first,
+    so that nothing is computed for the counters when the instrumentation is disabled.
+    Input:
+        - name: the name of the stage in the report
+        - counters: the values to add, by counter name
+    '''
+    record = _stage_record(name)
+    for counter, value in counters.items():
+        record[counter] = record.get(counter, 0) + value
+
+def _stage_record(name):
+    record = _stages.get(name)
+    if record is None:
+        record = _stages[name] = {"calls": 0, "wall_time": 0.0}
+    return record
+
+def report():
+    '''
+    Output:
+        - a dictionary, in the form {"pid": ..., "argv": [...], "stages": {<stage>: {"calls", "wall_time", <counters>...}}},
+          with moves_per_s added to the stages that count moves
+    '''
+    stages = {}
+    for name, record in _stages.items():
+        stages[name] = dict(record)
+        if record.get("moves") and record["wall_time"] > 0:
+            stages[name]["moves_per_s"] = record["moves"] / record["wall_time"]
+    return {"pid": os.getpid(), "argv": sys.argv, "stages": stages}
+
+def write_report():
+    '''
+    Write the report as JSON to the report file (or the standard error), and dump the cProfile statistics if any.
+    '''
+    if _profiler is not None:
+        disable()
+    if not _stages:
+        return
+    if _report_file is None:
+        print(json.dumps(report(), indent = 2), file = sys.stderr)
+    else:
+        with open(_report_file, "w") as f:
+            json.dump(report(), f, indent = 2)
+
+
+if os.environ.get(ENV_VAR, "") not in ("", "0"):
+    enable(None if os.environ[ENV_VAR] == "1" else os.environ[ENV_VAR], os.environ.get(CPROFILE_ENV_VAR) or None)
@@ -1,12 +1,19 @@
 import argparse
 import json
-from calculate_solution import compute_full_sequence
-from utils import is_valid_rods_state, print_solution, save_solution
+import sys
+from itertools import islice
+import instrumentation
+from calculate_solution import count_optimal_moves, iter_full_sequence
+from multi_rod_solution import iter_multi_rod_sequence
+from solution_cache import SolutionCache
+from utils import is_valid_rods_state, parse_rods, print_solution, save_solution, write_solution
 
 
-def input_method_classic():
+def input_method_classic(k = 3):
     '''
     Input method where all rings start on one rod and must move to target rod.
+    Input:
+        - k: the number of rods
     Output:
         - rods: a dictionary, in the form {1: <list>, 2: <list>, 3: <list>}
             - 1: the state of the first (left) rod, represented as a list of rings ordered from bottom to top
@@ -23,20 +30,22 @@ def input_method_classic():
             break
         except ValueError:
             print("❌ Please enter a valid integer.")
+    rods_range = range(1, k + 1)
+    rods_choice = ", ".join(str(rod) for rod in rods_range[:-1])
     while True:
         try:
-            start = int(input("Give the starting rod (type 1, 2 or 3): "))
-            if start not in (1, 2, 3):
-                print("❌ The starting rod must be 1, 2, or 3!")
+            start = int(input(f"Give the starting rod (type {rods_choice} or {k}): "))
+            if start not in rods_range:
+                print(f"❌ The starting rod must be {rods_choice}, or {k}!")
                 continue
             break
         except ValueError:
             print("❌ Please enter a valid integer.")
     while True:
         try:
-            target = int(input("Give the target rod (type 1, 2 or 3): "))
-            if target not in (1, 2, 3):
-                print("❌ The target rod must be 1, 2, or 3!")
+            target = int(input(f"Give the target rod (type {rods_choice} or {k}): "))
+            if target not in rods_range:
+                print(f"❌ The target rod must be {rods_choice}, or {k}!")
                 continue
             if start == target:
                 print("❌ The starting and target rods must be different!")
@@ -44,7 +53,7 @@ def input_method_classic():
             break
         except ValueError:
             print("❌ Please enter a valid integer.")
-    rods = {1: [], 2: [], 3: []}
+    rods = {rod: [] for rod in rods_range}
     rods[start] = list(range(n, 0, -1))
     if not is_valid_rods_state(rods):
         print(f"❌ Problem has an invalid configuration!")
@@ -148,6 +157,52 @@ def input_method_problems(file = "problems.json"):
             print(f"❌ An error occurred: {e}")
             continue
 
+def solve_batch(lines, out, solver = iter_full_sequence, with_moves = False, m_from = 1, m_stop = None):
+    '''
+    Non-interactive mode: solve one problem per line and stream one JSON result per line.
+    Input:
+        - lines: an iterable of JSON lines, each one in the form {"rods": {"1": <list>, "2": <list>, "3": <list>}, "target": t}
+          (an "initial_state" key is accepted instead of "rods", as in problems.json, and an optional "id" is echoed back)
+        - out: the text stream to write the results to
+        - solver: the function giving the moves of a solution, as calculate_solution.iter_full_sequence
+        - with_moves: whether to include the moves m_from <= m < m_stop of the solutions in the results
+        - m_from: the number of the first move to include
+        - m_stop: the number of the move right after the last move to include (None for the end of the solutions)
+    Output:
+        - (solved, failed): the numbers of solved and failed problems
+    '''
+    solved = failed = 0
+    for line_num, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        result = {"line": line_num}
+        try:
+            problem = json.loads(line)
+            if not isinstance(problem, dict):
+                raise ValueError("❌ Each line must be a JSON object {\"rods\": {...}, \"target\": t}!")
+            if "id" in problem:
+                result["id"] = problem["id"]
+            rods, error = parse_rods(problem.get("rods", problem.get("initial_state")))
+            target = problem.get("target")
+            if error is None and (type(target) is not int or target not in (1, 2, 3)):
+                error = "❌ The target rod must be 1, 2, or 3!"
+            if error is not None:
+                raise ValueError(error)
+            result["target"] = target
+            result["total_moves"] = count_optimal_moves(rods, target)
+            if with_moves:
+                result["moves"] = [list(move) for move in solver(rods, target, m_from, m_stop)]
+            solved += 1
+        except json.JSONDecodeError as e:
+            result["error"] = f"❌ Invalid JSON format: {e}!"
+            failed += 1
+        except ValueError as e:
+            result["error"] = str(e)
+            failed += 1
+        out.write(json.dumps(result, ensure_ascii = False, separators = (",", ":")) + "\n")
+        out.flush()
+    return solved, failed
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Tower of Hanoi Solver")
@@ -155,30 +210,99 @@ if __name__ == "__main__":
                         help = "Choose input method: 'c' (classic, all-together, default), 'm' (manual, custom), or 'p' (preset, problems).")
     parser.add_argument("-s", choices = ["y", "n"], default = "n", 
                         help = "Enable ('y') or not ('n') the possibility to save the found solutions.")
+    parser.add_argument("--from", dest = "m_from", type = int, default = 1,
+                        help = "The number of the first move to output (default: 1).")
+    parser.add_argument("--to", dest = "m_to", type = int, default = None,
+                        help = "The number of the last move to output (default: the last move of the solution).")
+    parser.add_argument("-f", "--format", choices = ["text", "csv", "jsonl", "binary"], default = "text",
+                        help = "The output format of the moves: 'text' (default), 'csv', 'jsonl' or 'binary' (3 bytes r, x, y per move).")
+    parser.add_argument("-o", "--output", default = None,
+                        help = "The file to write the moves to (default: the standard output).")
+    parser.add_argument("--profile", nargs = "?", const = "-", default = None,
+                        help = "Record the time, moves and bytes of every stage and write them as JSON at exit, to the given file or to the standard error.")
+    parser.add_argument("--cprofile", default = None, help = "The file to dump the cProfile statistics of the run to.")
+    parser.add_argument("--rods", type = int, default = 3,
+                        help = "The number of rods (default: 3); with more than 3 rods, the classic input method is solved with the Frame-Stewart algorithm.")
+    parser.add_argument("--batch", nargs = "?", const = "-", default = None, metavar = "FILE",
+                        help = "Solve the JSONL problems of FILE (or of the standard input), one {\"rods\": ..., \"target\": ...} per line, and write one JSON result per line.")
+    parser.add_argument("--moves", action = "store_true",
+                        help = "In batch mode, include the moves (between --from and --to) in the results.")
+    parser.add_argument("--cache", type = int, nargs = "?", const = 2**24, default = None, metavar = "MAX_MOVES",
+                        help = "Answer problems equivalent up to a relabeling of the rods from a cache of solutions, holding up to MAX_MOVES moves in memory (default: 2**24).")
+    parser.add_argument("--recipe", action = "store_true",
+                        help = "Save only the recipes of the solutions (the problem, the solver version and a checksum), generating their moves again when they are loaded.")
+    parser.add_argument("--cache-file", default = None,
+                        help = "An SQLite file (e.g. cache.db) keeping the cached solutions across runs (implies --cache).")
     args = parser.parse_args()
+    if args.profile is not None or args.cprofile is not None:
+        instrumentation.enable(None if args.profile in (None, "-") else args.profile, args.cprofile)
     input_method = args.im
     ask_save = args.s
+    if args.m_from < 1 or (args.m_to is not None and args.m_to < args.m_from):
+        parser.error("the move range must satisfy 1 <= --from <= --to")
+    m_stop = None if args.m_to is None else args.m_to + 1
+    if args.rods < 3 or args.rods > 3 and (input_method != "c" or args.batch is not None):
+        parser.error("--rods must be at least 3, and more than 3 rods are only supported by the classic input method")
+    is_cached = args.cache is not None or args.cache_file is not None
+    if args.cache is not None and args.cache < 0:
+        parser.error("--cache must be at least 0")
+    if args.rods > 3 and is_cached:
+        parser.error("--cache and --cache-file only support 3 rods")
+    solver = iter_full_sequence
+    solver_stage = "iter_full_sequence"
+    if is_cached:
+        solver = SolutionCache(2**24 if args.cache is None else args.cache, args.cache_file).iter_full_sequence
+    elif args.rods > 3:
+        def solver(rods, target, m_start = 1, m_stop = None):
+            start, = (rod for rod, rings in rods.items() if rings)
+            moves = iter_multi_rod_sequence(len(rods[start]), len(rods), start, target)
+            return islice(moves, m_start - 1, None if m_stop is None else m_stop - 1)
+        solver_stage = "iter_multi_rod_sequence"
+    if args.batch is not None:
+        with open(args.batch, "r") if args.batch != "-" else open(sys.stdin.fileno(), "r", closefd = False) as lines, \
+             open(args.output, "w") if args.output is not None else open(sys.stdout.fileno(), "w", closefd = False) as out:
+            solved, failed = solve_batch(lines, out, solver, args.moves, args.m_from, m_stop)
+        sys.exit(1 if failed else 0)
     while True:
         try:
             rods = None
             target = None
             if input_method == "c":
-                rods, target = input_method_classic()
+                rods, target = input_method_classic(args.rods)
             elif input_method == "m":
                 rods, target = input_method_custom()
             elif input_method == "p":                
                 rods, target = input_method_problems()
             if rods is None:
                 continue
-            seq = compute_full_sequence(rods, target)
-            print_solution(seq)
+            if args.format == "binary" and max(max(rings, default = 0) for rings in rods.values()) > 255:
+                print("❌ The binary format supports up to 255 rings, use the 'text', 'csv' or 'jsonl' format instead!")
+                continue
+            moves = solver(rods, target, args.m_from, m_stop)
+            if instrumentation.is_enabled():
+                # The moves are generated while they are written: their generation is reported as a stage of its own
+                moves = instrumentation.stage_iter(solver_stage, moves)
+            if args.output is not None:
+                with open(args.output, "wb" if args.format == "binary" else "w") as f:
+                    write_solution(moves, f, args.format, args.m_from)
+                print(f"✅ Moves written to {args.output}!")
+            elif args.format == "text":
+                print_solution(moves, args.m_from)
+            else:
+                write_solution(moves, fmt = args.format, first_move = args.m_from)
             while ask_save == "y":
                 try:
                     save_choice = input("\nDo you want to save this solution? (y/n, default=n): ").strip().lower()
                     if save_choice in ["", "n"]:
                         break
                     elif save_choice == "y":
-                        save_solution(rods, target, seq, "solutions.json")
+                        if len(rods) > 3:
+                            print("❌ Only solutions with 3 rods can be saved!")
+                            break
+                        seq = None if args.recipe else solver(rods, target)
+                        if seq is not None and instrumentation.is_enabled():
+                            seq = instrumentation.stage_iter(solver_stage, seq)
+                        save_solution(rods, target, seq, "solutions.json", args.recipe)
                         break
                     else:
                         print("Please enter 'y' or 'n'!")
@@ -0,0 +1,92 @@
+from calculate_solution import compute_move_batch
+
+
+_TABLES = {}
+
+
+def frame_stewart_table(n, k):
+    '''
+    Frame-Stewart tables for k rods, computed once and extended on demand, so that they are reused across queries.
+    Moving the m smallest rings with k rods is done by moving the i smallest of them aside with k rods, the m - i
+    others with the k - 1 remaining rods, and the i smallest back on top of them with k rods again; the best split i
+    gives moves[m] = min(2 * moves[i] + moves'[m - i]), where moves' is the table of k - 1 rods.
+    Input:
+        - n: the number of rings the tables must reach
+        - k: the number of rods (at least 3)
+    Output:
+        - moves: a list with the number of moves moves[m] of the Frame-Stewart solution of m rings, for m = 0, ..., n at least
+        - splits: a list with the best split splits[m] of m rings (None for 3 rods, whose solution is the classic one)
+    '''
+    if k not in _TABLES:
+        _TABLES[k] = ([0], [None])
+    moves, splits = _TABLES[k]
+    if k == 3:
+        while len(moves) <= n:
+            moves.append(2**len(moves) - 1)
+            splits.append(None)
+        return moves, splits
+    fewer_moves = frame_stewart_table(n, k - 1)[0]
+    while len(moves) <= n:
+        m = len(moves)
+        if m == 1:
+            moves.append(1)
+            splits.append(0)
+            continue
+        best, split = min((2 * moves[i] + fewer_moves[m - i], i) for i in range(1, m))
+        moves.append(best)
+        splits.append(split)
+    return moves, splits
+
+def count_multi_rod_moves(n, k):
+    '''
+    Input:
+        - n: the total number of rings
+        - k: the number of rods (at least 3)
+    Output:
+        - the number of moves of the Frame-Stewart solution of n rings with k rods (the optimal one for 3 and 4 rods)
+    '''
+    return frame_stewart_table(n, k)[0][n]
+
+def iter_multi_rod_sequence(n, k, s, f):
+    '''
+    Generate the Frame-Stewart solution of the classic game with k rods, with an explicit stack of subproblems
+    instead of recursion: every subproblem moves the rings low + 1, ..., low + m from one rod to another, using the
+    given free rods, and is split with the tables of frame_stewart_table. Subproblems with 3 rods are generated
+    from the closed form of compute_move_batch.
+    Input:
+        - n: the total number of rings
+        - k: the number of rods (at least 3)
+        - s: the number of the starting rod
+        - f: the number of the final rod
+    Output:
+        - a generator of the (r, x, y) moves of the solution
+    '''
+    tables = {rods: frame_stewart_table(n, rods)[1] for rods in range(3, k + 1)}
+    stack = [(n, 0, s, f, tuple(rod for rod in range(1, k + 1) if rod not in (s, f)))]
+    while stack:
+        m, low, source, dest, free = stack.pop()
+        if m == 0:
+            continue
+        if m == 1:
+            yield low + 1, source, dest
+            continue
+        if len(free) == 1:
+            labels = (0, source, free[0], dest)
+            rings, xs, ys = compute_move_batch(m, 1, 3, 1, 2**m)
+            yield from ((low + r, labels[x], labels[y]) for r, x, y in zip(rings, xs, ys))
+            continue
+        i = tables[len(free) + 2][m]
+        aside, others = free[0], free[1:]
+        # Pushed in reverse order: the i smallest rings go aside, the others go to dest, and the i smallest follow
+        stack.append((i, low, aside, dest, others + (source,)))
+        stack.append((m - i, low + i, source, dest, others))
+        stack.append((i, low, source, aside, others + (dest,)))
+
+def compute_multi_rod_sequence(n, k, s, f):
+    '''
+    Input:
+        - n, k, s, f: as in iter_multi_rod_sequence
+    Output:
+        - seq: a dictionary, in the form {m1: [r1, x1, y1], m2: [r2, x2, y2], ...}
+    '''
+    return {m: [r, x, y] for m, (r, x, y) in enumerate(iter_multi_rod_sequence(n, k, s, f), 1)}
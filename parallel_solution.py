@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from operator import and_, rshift
+from itertools import repeat
+from binary_solution import BinarySolution, allocate_binary_solution, update_binary_checksum
+from calculate_solution import compute_record_batch, iter_classic_records, state_at_move
+from utils import masks_to_rods, play_moves, play_records, rods_to_masks
+
+
+def _fill_chunk(file, offset, n, s, f, m_start, m_stop):
+    '''
+    Worker of export_classic_solution: compute the records of the moves m_start <= m < m_stop and write them
+    in their place of the binary file, which no other worker writes to.
+    Output:
+        - the number of written moves
+    '''
+    records = compute_record_batch(n, s, f, m_start, m_stop)
+    if sys.byteorder != "little":
+        records.byteswap()
+    with open(file, "r+b") as out:
+        out.seek(offset + 2 * (m_start - 1))
+        out.write(records)
+    return len(records)
+
+def export_classic_solution(n, s, f, file, jobs = None, chunk = 2**22):
+    '''
+    Export the classic solution of n rings from rod s to rod f to a binary solution file (see binary_solution),
+    computing it in parallel. Since compute_move_batch gives any range of moves from the closed form, the moves
+    1 ... 2**n - 1 are split in chunks that worker processes compute independently and write directly to their
+    place of the preallocated file; the checksum is then computed over the whole file. With a single job, the moves
+    are instead composed from the relabeled templates of iter_classic_records and written in order, which is
+    bound by the disk rather than by the computation.
+    Input:
+        - n: the total number of rings
+        - s: the number of the starting rod
+        - f: the number of the final rod
+        - file: the binary file's name to save the solution to
+        - jobs: the number of worker processes (the number of CPUs, if not given)
+        - chunk: the number of moves computed by a worker at once
+    Output:
+        - the number of exported moves
+    '''
+    rods = {1: [], 2: [], 3: []}
+    rods[s] = list(range(n, 0, -1))
+    total_moves = 2**n - 1
+    offset = allocate_binary_solution(rods, f, total_moves, file)
+    if jobs == 1:
+        with open(file, "r+b") as out:
+            out.seek(offset)
+            for block in iter_classic_records(n, s, f):
+                out.write(block)
+        update_binary_checksum(file)
+        return total_moves
+    with ProcessPoolExecutor(max_workers = jobs) as pool:
+        futures = [pool.submit(_fill_chunk, file, offset, n, s, f, m_start, m_start + chunk) for m_start in range(1, total_moves + 1, chunk)]
+        written = sum(future.result() for future in futures)
+    update_binary_checksum(file)
+    return written
+
+
+def _scan_chunk(file, m_start, m_stop):
+    '''
+    Worker of verify_solution_parallel: find where every ring that moves in the moves m_start <= m < m_stop ends,
+    without checking the moves.
+    Output:
+        - a dictionary {r: y}, with the end rod of the last move of each ring r in the chunk
+    '''
+    with BinarySolution(file) as seq:
+        records = seq.records(m_start, m_stop)
+        if sys.byteorder != "little":
+            return {r: y for r, x, y in (seq[m] for m in range(m_start, m_stop))}
+        records_list = records.tolist()
+        records.release()
+    # The dictionary keeps the last value given to every key, i.e. the end rod of the last move of every ring
+    return dict(zip(map(rshift, records_list, repeat(4)), map(and_, records_list, repeat(3))))
+
+def _verify_chunk(file, m_start, m_stop, masks):
+    '''
+    Worker of verify_solution_parallel: check the moves m_start <= m < m_stop, starting from the rods state masks
+    (see utils.rods_to_masks).
+    Output:
+        - None or (m, message) for the first illegal move of the chunk, and the masks of the state after the chunk
+    '''
+    with BinarySolution(file) as seq:
+        if sys.byteorder != "little":
+            error = play_moves(masks, (seq[m] for m in range(m_start, m_stop)), m_start)
+        else:
+            records = seq.records(m_start, m_stop)
+            error = play_records(masks, records, m_start)
+            records.release()
+    return error, masks
+
+def verify_solution_parallel(file, jobs = None, chunk = 2**22, verbose = True):
+    '''
+    Verify a binary solution file (see binary_solution) in parallel, splitting its moves in chunks checked concurrently
+    from checkpoint states. For classic problems the state at the start of every chunk comes from the closed form
+    (calculate_solution.state_at_move); otherwise, or if the moves stray from the classic solution, a first parallel pass
+    finds where every ring ends in every chunk, and the checkpoint states are chained from the initial state.
+    The first illegal move found is the same as with utils.verify_solution, since the checkpoint state of the chunk
+    holding it is reached by legal moves only.
+    Input:
+        - file: the binary file's name to verify
+        - jobs: the number of worker processes (the number of CPUs, if not given)
+        - chunk: the number of moves checked by a worker at once
+        - verbose: whether to print the outcome of the verification
+    Output:
+        - a boolean indicating whether the solution is valid
+    '''
+    with BinarySolution(file) as seq:
+        rods, target, total_moves = seq.initial_state, seq.target, len(seq)
+        is_intact = seq.verify_checksum()
+    if not is_intact:
+        if verbose:
+            print(f"❌ Checksum mismatch! The moves do not match the checksum stored in {file}!")
+        return False
+    n = len(rods[1] + rods[2] + rods[3])
+    starts = list(range(1, total_moves + 1, chunk))
+    stops = [min(m_start + chunk, total_moves + 1) for m_start in starts]
+    files = [file] * len(starts)
+    with ProcessPoolExecutor(max_workers = jobs) as pool:
+        results = None
+        sources = [rod for rod in (1, 2, 3) if len(rods[rod]) == n]
+        if sources and sources[0] != target and total_moves == 2**n - 1:
+            checkpoints = [rods_to_masks(state_at_move(n, sources[0], target, m_start - 1)) for m_start in starts]
+            results = list(pool.map(_verify_chunk, files, starts, stops, checkpoints))
+            # The closed form checkpoints are exact as long as every chunk ends where the next one starts
+            mismatch = next((i for i in range(len(starts) - 1) if results[i][1] != checkpoints[i + 1]), None)
+            first_error = next((i for i, (error, masks) in enumerate(results) if error is not None), None)
+            if mismatch is not None and (first_error is None or first_error > mismatch):
+                results = None
+        if results is None:
+            checkpoints = []
+            masks = rods_to_masks(rods)
+            for ends in pool.map(_scan_chunk, files, starts, stops):
+                checkpoints.append(masks[:])
+                for ring, rod in ends.items():
+                    bit = 1 << (ring - 1) if ring > 0 else 0
+                    masks = [mask & ~bit for mask in masks]
+                    masks[rod] |= bit
+            results = list(pool.map(_verify_chunk, files, starts, stops, checkpoints))
+    for error, masks in results:
+        if error is not None:
+            if verbose:
+                print(error[1])
+            return False
+    masks = results[-1][1] if results else rods_to_masks(rods)
+    if masks[target] == (1 << n) - 1 and all(masks[rod] == 0 for rod in [1, 2, 3] if rod != target):
+        if verbose:
+            print(f"✅ Solution is valid! All rings are correctly placed on the target rod {target}!")
+        return True
+    if verbose:
+        current_rods = masks_to_rods(masks)
+        print("❌ Solution is invalid! Final state does not match expected configuration!")
+        print(f"Expected: Rod {target} = {list(range(n, 0, -1))}, other rods empty.")
+        print(f"Actual: Rod 1 = {current_rods[1]}, Rod 2 = {current_rods[2]}, Rod 3 = {current_rods[3]}.")
+    return False
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Parallel Tower of Hanoi Solution Export and Verification")
+    subparsers = parser.add_subparsers(dest = "command", required = True)
+    export_parser = subparsers.add_parser("export", help = "Export a classic solution to a binary file.")
+    export_parser.add_argument("n", type = int, help = "The number of rings.")
+    export_parser.add_argument("s", type = int, choices = [1, 2, 3], help = "The starting rod.")
+    export_parser.add_argument("f", type = int, choices = [1, 2, 3], help = "The final rod.")
+    export_parser.add_argument("file", help = "The binary file to export the solution to (e.g. classic_28.hnb).")
+    verify_parser = subparsers.add_parser("verify", help = "Verify a binary solution file.")
+    verify_parser.add_argument("file", help = "The binary file to verify (e.g. classic_28.hnb).")
+    for subparser in (export_parser, verify_parser):
+        subparser.add_argument("-j", "--jobs", type = int, default = os.cpu_count(), help = "The number of worker processes (default: the number of CPUs).")
+        subparser.add_argument("--chunk", type = int, default = 2**22, help = "The number of moves handled by a worker at once.")
+    args = parser.parse_args()
+    start = time.perf_counter()
+    if args.command == "export":
+        if args.s == args.f or not 1 <= args.n <= 4095:
+            print("❌ The starting and final rods must be different and the number of rings between 1 and 4095!")
+            sys.exit(1)
+        written = export_classic_solution(args.n, args.s, args.f, args.file, args.jobs, args.chunk)
+        print(f"✅ Exported {written} moves to {args.file} in {time.perf_counter() - start:.3f} s!")
+    else:
+        is_valid = verify_solution_parallel(args.file, args.jobs, args.chunk)
+        print(f"⏱️  Wall time: {time.perf_counter() - start:.3f} s")
+        sys.exit(0 if is_valid else 1)
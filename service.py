@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from calculate_solution import compute_move_transition, count_optimal_moves, iter_full_sequence, min_moves, state_at_move
+from utils import parse_rods, verify_solution
+
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+INLINE_MOVES = 2**12
+MAX_RESPONSE_MOVES = 2**20
+# The largest number of rings of the move and state requests, as for the packed move records (see binary_solution.pack_move)
+MAX_RINGS = 4095
+
+
+def _parse_rods(data):
+    rods, error = parse_rods(data)
+    if error is not None:
+        raise ValueError(error)
+    return rods
+
+def _parse_rod(request, name):
+    rod = request.get(name)
+    if type(rod) is not int or rod not in (1, 2, 3):
+        raise ValueError(f"{name} must be 1, 2 or 3")
+    return rod
+
+def _parse_classic(request):
+    n = request.get("n")
+    if type(n) is not int or not 1 <= n <= MAX_RINGS:
+        raise ValueError(f"n must be an integer between 1 and {MAX_RINGS}")
+    s, f = _parse_rod(request, "s"), _parse_rod(request, "f")
+    if s == f:
+        raise ValueError("s and f must be different")
+    return n, s, f
+
+def _parse_move_number(request, n, name = "m", lowest = 1):
+    m = request.get(name)
+    if type(m) is not int or not lowest <= m <= 2**n - 1:
+        raise ValueError(f"{name} must be an integer between {lowest} and 2**n - 1")
+    return m
+
+def _solve(rods, target, m_start, m_stop):
+    return [list(move) for move in iter_full_sequence(rods, target, m_start, m_stop)]
+
+def _solve_batch(problems):
+    '''
+    Worker of the service: solve a batch of (rods, target, m_start, m_stop) problems, solving every distinct problem once.
+    Output:
+        - the list of the moves of every problem, in order
+    '''
+    solved = {}
+    results = []
+    for rods, target, m_start, m_stop in problems:
+        key = (json.dumps(rods, sort_keys = True), target, m_start, m_stop)
+        if key not in solved:
+            solved[key] = _solve(rods, target, m_start, m_stop)
+        results.append(solved[key])
+    return results
+
+def _verify(rods, target, moves):
+    messages = io.StringIO()
+    with contextlib.redirect_stdout(messages):
+        is_valid = verify_solution(rods, moves, target)
+    return {"valid": is_valid, "message": messages.getvalue().strip()}
+
+def _verify_batch(problems):
+    '''
+    Worker of the service: verify a batch of (rods, target, moves) solutions.
+    Output:
+        - the list of {"valid": ..., "message": ...} results, in order
+    '''
+    return [_verify(rods, target, moves) for rods, target, moves in problems]
+
+
+class _Batcher:
+    '''
+    Collects the heavy requests that arrive within a short window and sends them to the process pool as a single
+    task, so that concurrent requests share one round trip to a worker.
+    '''
+
+    def __init__(self, pool, func, window = 0.002, max_size = 64):
+        self.pool = pool
+        self.func = func
+        self.window = window
+        self.max_size = max_size
+        self._items = []
+        self._futures = []
+        self._flush_handle = None
+
+    def submit(self, item):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._items.append(item)
+        self._futures.append(future)
+        if len(self._items) >= self.max_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.window, self._flush)
+        return future
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        items, futures = self._items, self._futures
+        self._items, self._futures = [], []
+        if items:
+            asyncio.ensure_future(self._run(items, futures))
+
+    async def _run(self, items, futures):
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(self.pool, self.func, items)
+        except Exception as e:
+            for future in futures:
+                future.set_exception(e)
+            return
+        for future, result in zip(futures, results):
+            future.set_result(result)
+
+
+class HanoiService:
+    '''
+    Long-running query service answering JSON requests, one per line, with one JSON response per line carrying the
+    "id" of its request (responses of a connection may come out of order). Cheap requests are answered in the event
+    loop; solutions or verifications of more than INLINE_MOVES moves are batched and run in a process pool.
+    Operations:
+        - {"op": "move", "n": n, "s": s, "f": f, "m": m} -> [r, x, y], the move m of the classic game
+        - {"op": "state", "n": n, "s": s, "f": f, "m": m} -> the rods state right after move m of the classic game
+        - {"op": "distance", "rods": rods, "target": target} -> the number of moves of the optimal solution
+        - {"op": "distance", "rods": rods, "rods_to": rods_to} -> the number of moves of the shortest path between two states
+        - {"op": "solve", "rods": rods, "target": target, "from": m_from, "to": m_to} -> the moves m_from ... m_to
+          (both optional) of the optimal solution, as [[r, x, y], ...]
+        - {"op": "verify", "rods": rods, "target": target, "moves": [[r, x, y], ...]} -> {"valid": ..., "message": ...}
+    '''
+
+    def __init__(self, jobs = None):
+        self.pool = ProcessPoolExecutor(max_workers = jobs)
+        self._solver = _Batcher(self.pool, _solve_batch)
+        self._verifier = _Batcher(self.pool, _verify_batch)
+
+    async def handle(self, request):
+        '''
+        Input:
+            - request: the decoded JSON request
+        Output:
+            - the JSON response, as a dictionary {"id": ..., "result": ...} or {"id": ..., "error": ...}
+        '''
+        request_id = request.get("id") if isinstance(request, dict) else None
+        try:
+            if not isinstance(request, dict):
+                raise ValueError("the request must be a JSON object")
+            op = request.get("op")
+            if op == "move":
+                n, s, f = _parse_classic(request)
+                result = list(compute_move_transition(n, s, f, _parse_move_number(request, n)))
+            elif op == "state":
+                n, s, f = _parse_classic(request)
+                rods = state_at_move(n, s, f, _parse_move_number(request, n, lowest = 0))
+                result = {str(rod): rings for rod, rings in rods.items()}
+            elif op == "distance" and "rods_to" in request:
+                rods_from, rods_to = _parse_rods(request.get("rods")), _parse_rods(request.get("rods_to"))
+                if sum(map(len, rods_from.values())) != sum(map(len, rods_to.values())):
+                    raise ValueError("rods and rods_to must have the same rings")
+                result = min_moves(rods_from, rods_to)
+            elif op == "distance":
+                result = count_optimal_moves(_parse_rods(request.get("rods")), _parse_rod(request, "target"))
+            elif op == "solve":
+                result = await self._solve(request)
+            elif op == "verify":
+                result = await self._verify(request)
+            else:
+                raise ValueError(f"unknown op {op!r} (expected move, state, distance, solve or verify)")
+            return {"id": request_id, "result": result}
+        except Exception as e:
+            return {"id": request_id, "error": str(e)}
+
+    async def _solve(self, request):
+        rods, target = _parse_rods(request.get("rods")), _parse_rod(request, "target")
+        total_moves = count_optimal_moves(rods, target)
+        m_from = request.get("from", 1)
+        m_to = request.get("to", total_moves)
+        if type(m_from) is not int or type(m_to) is not int or m_from < 1:
+            raise ValueError("from and to must be integers, with from >= 1")
+        m_to = min(m_to, total_moves)
+        if m_to - m_from + 1 > MAX_RESPONSE_MOVES:
+            raise ValueError(f"the solution has {total_moves} moves, ask for at most {MAX_RESPONSE_MOVES} of them with from and to")
+        if m_to - m_from + 1 <= INLINE_MOVES:
+            return _solve(rods, target, m_from, m_to + 1)
+        return await self._solver.submit((rods, target, m_from, m_to + 1))
+
+    async def _verify(self, request):
+        rods, target, moves = _parse_rods(request.get("rods")), _parse_rod(request, "target"), request.get("moves")
+        if not isinstance(moves, list) or not all(isinstance(move, list) and len(move) == 3 and all(type(value) is int for value in move) for move in moves):
+            raise ValueError("moves must be a list of [r, x, y] moves of integers")
+        if len(moves) <= INLINE_MOVES:
+            return _verify(rods, target, moves)
+        return await self._verifier.submit((rods, target, moves))
+
+    async def serve_connection(self, reader, writer):
+        tasks = set()
+        async def respond(line):
+            try:
+                request = json.loads(line)
+            except json.JSONDecodeError as e:
+                response = {"id": None, "error": f"invalid JSON: {e}"}
+            else:
+                response = await self.handle(request)
+            writer.write(json.dumps(response, separators = (",", ":")).encode() + b"\n")
+        try:
+            while line := await reader.readline():
+                if line.strip():
+                    task = asyncio.ensure_future(respond(line))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                    if writer.transport.get_write_buffer_size() > 2**20:
+                        await writer.drain()
+            if tasks:
+                await asyncio.gather(*tasks)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def close(self):
+        self.pool.shutdown()
+
+
+async def serve(host = DEFAULT_HOST, port = DEFAULT_PORT, jobs = None):
+    '''
+    Run the service on a local TCP socket until interrupted.
+    Input:
+        - host: the address to listen on (the local interface, by default)
+        - port: the port to listen on
+        - jobs: the number of worker processes of the pool (the number of CPUs, if not given)
+    '''
+    service = HanoiService(jobs)
+    server = await asyncio.start_server(service.serve_connection, host, port, limit = 2**26)
+    print(f"✅ Hanoi service listening on {host}:{port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+async def _client(host, port, requests, latencies):
+    reader, writer = await asyncio.open_connection(host, port, limit = 2**26)
+    try:
+        for request in requests:
+            start = time.perf_counter()
+            writer.write(json.dumps(request).encode() + b"\n")
+            response = json.loads(await reader.readline())
+            latencies.append(time.perf_counter() - start)
+            if "error" in response:
+                print(f"❌ Request {request} failed: {response['error']}")
+    finally:
+        writer.close()
+
+def _bench_requests(op, n, count):
+    if op == "move":
+        return [{"id": i, "op": "move", "n": n, "s": 1, "f": 3, "m": 1 + i * 7919 % (2**n - 1)} for i in range(count)]
+    if op == "state":
+        return [{"id": i, "op": "state", "n": n, "s": 1, "f": 3, "m": i * 7919 % 2**n} for i in range(count)]
+    rods = {"1": list(range(n, 0, -1)), "2": [], "3": []}
+    if op == "distance":
+        return [{"id": i, "op": "distance", "rods": rods, "target": 3} for i in range(count)]
+    return [{"id": i, "op": "solve", "rods": rods, "target": 2 + i % 2} for i in range(count)]
+
+async def run_load(host = DEFAULT_HOST, port = DEFAULT_PORT, op = "move", n = 20, requests = 10000, concurrency = 32):
+    '''
+    Local load generator: send requests over concurrent connections, each one waiting for the response to its
+    previous request before sending the next one.
+    Input:
+        - host, port: the address of the service
+        - op: the operation to ask for (move, state, distance or solve)
+        - n: the number of rings of the problems
+        - requests: the total number of requests
+        - concurrency: the number of concurrent connections
+    Output:
+        - a dictionary with the number of requests, the wall time, the throughput and the p50/p99 latencies in seconds
+    '''
+    all_requests = _bench_requests(op, n, requests)
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*(_client(host, port, all_requests[i::concurrency], latencies) for i in range(concurrency)))
+    wall_time = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "wall_time": wall_time,
+        "requests_per_s": len(latencies) / wall_time,
+        "p50": latencies[len(latencies) // 2],
+        "p99": latencies[min(len(latencies) - 1, len(latencies) * 99 // 100)]
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Tower of Hanoi Query Service")
+    subparsers = parser.add_subparsers(dest = "command", required = True)
+    serve_parser = subparsers.add_parser("serve", help = "Run the service.")
+    serve_parser.add_argument("-j", "--jobs", type = int, default = os.cpu_count(), help = "The number of worker processes (default: the number of CPUs).")
+    load_parser = subparsers.add_parser("load", help = "Measure the latency of a running service.")
+    load_parser.add_argument("--op", choices = ["move", "state", "distance", "solve"], default = "move", help = "The operation to ask for (default: move).")
+    load_parser.add_argument("-n", type = int, default = 20, help = "The number of rings of the problems (default: 20).")
+    load_parser.add_argument("--requests", type = int, default = 10000, help = "The total number of requests (default: 10000).")
+    load_parser.add_argument("-c", "--concurrency", type = int, default = 32, help = "The number of concurrent connections (default: 32).")
+    for subparser in (serve_parser, load_parser):
+        subparser.add_argument("--host", default = DEFAULT_HOST, help = f"The address of the service (default: {DEFAULT_HOST}).")
+        subparser.add_argument("--port", type = int, default = DEFAULT_PORT, help = f"The port of the service (default: {DEFAULT_PORT}).")
+    args = parser.parse_args()
+    if args.command == "serve":
+        try:
+            asyncio.run(serve(args.host, args.port, args.jobs))
+        except KeyboardInterrupt:
+            print("\nService stopped by user.")
+    else:
+        try:
+            stats = asyncio.run(run_load(args.host, args.port, args.op, args.n, args.requests, args.concurrency))
+        except ConnectionError as e:
+            print(f"❌ Cannot reach the service at {args.host}:{args.port}: {e}!")
+            sys.exit(1)
+        print(f"📊 {stats['requests']} {args.op} requests in {stats['wall_time']:.3f} s ({stats['requests_per_s']:.0f} requests/s)")
+        print(f"⏱️  Latency: p50 = {stats['p50'] * 1000:.3f} ms, p99 = {stats['p99'] * 1000:.3f} ms")
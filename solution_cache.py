@@ -0,0 +1,129 @@
+import sys
+from array import array
+from collections import OrderedDict
+from itertools import permutations
+from binary_solution import MoveSequence, relabel_records, unpack_move
+from calculate_solution import compute_full_records
+from solution_store import SolutionStore
+
+
+_PERMUTATIONS = [dict(zip((1, 2, 3), perm)) for perm in permutations((1, 2, 3))]
+
+
+def canonical_problem(rods, target):
+    '''
+    Canonicalize a problem under the 6 relabelings of the rods: equivalent problems (e.g. 4 rings from rod 1 to 3
+    and 4 rings from rod 2 to 1) get the same canonical form, in which the target is rod 3.
+    Input:
+        - rods: a dictionary, in the form {1: <list>, 2: <list>, 3: <list>}
+        - target: the number of the target rod
+    Output:
+        - key: the canonical problem, as a hashable ((rings of rod 1), (rings of rod 2), (rings of rod 3))
+        - perm: the relabeling used, as a dictionary {original rod: canonical rod}
+    '''
+    candidates = []
+    for perm in _PERMUTATIONS:
+        if perm[target] != 3:
+            continue
+        key = [None, None, None]
+        for rod in (1, 2, 3):
+            key[perm[rod] - 1] = tuple(rods[rod])
+        candidates.append((tuple(key), perm))
+    return min(candidates, key = lambda candidate: candidate[0])
+
+
+class SolutionCache:
+    '''
+    Cache in front of the solver, keyed by the canonical form of the problems (see canonical_problem), so that a
+    problem equivalent to a cached one up to a relabeling of the rods is answered by relabeling the cached moves.
+    The moves are kept packed (2 bytes per move) in an LRU bounded by the total number of cached moves, and
+    optionally in an SQLite store (see solution_store.SolutionStore) that survives restarts.
+    Attributes:
+        - max_moves: the maximum total number of moves kept in memory
+        - hits, disk_hits, misses: the numbers of lookups answered from memory, from the store and by the solver
+    '''
+
+    def __init__(self, max_moves = 2**24, file = None):
+        self.max_moves = max_moves
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._moves = 0
+        self._store = SolutionStore(file) if file is not None else None
+
+    def records(self, rods, target):
+        '''
+        Input:
+            - rods: a dictionary, in the form {1: <list>, 2: <list>, 3: <list>}
+            - target: the number of the target rod
+        Output:
+            - the 16-bit little-endian records (see binary_solution.pack_move) of the moves of the optimal solution, as bytes
+        '''
+        key, perm = canonical_problem(rods, target)
+        records = self._entries.get(key)
+        if records is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+        else:
+            canonical_rods = {1: list(key[0]), 2: list(key[1]), 3: list(key[2])}
+            numbers = self._store.find(canonical_rods, 3) if self._store is not None else []
+            if numbers:
+                records = self._store.get_records(numbers[0])
+                self.disk_hits += 1
+            else:
+                moves = compute_full_records(canonical_rods, 3)
+                if sys.byteorder != "little":
+                    moves.byteswap()
+                records = moves.tobytes()
+                self.misses += 1
+                if self._store is not None:
+                    self._store.append_records(canonical_rods, 3, records)
+            self._add(key, records)
+        inverse = {canonical: rod for rod, canonical in perm.items()}
+        return relabel_records(records, inverse)
+
+    def _add(self, key, records):
+        moves = len(records) // 2
+        if moves > self.max_moves:
+            return
+        self._entries[key] = records
+        self._moves += moves
+        while self._moves > self.max_moves:
+            old_key, old_records = self._entries.popitem(last = False)
+            self._moves -= len(old_records) // 2
+
+    def iter_full_sequence(self, rods, target, m_start = 1, m_stop = None):
+        '''
+        Same as calculate_solution.iter_full_sequence, with the moves taken from the cache.
+        Output:
+            - a generator of the (r, x, y) moves m_start <= m < m_stop of the solution
+        '''
+        records = array("H")
+        records.frombytes(self.records(rods, target))
+        if sys.byteorder != "little":
+            records.byteswap()
+        m_stop = len(records) + 1 if m_stop is None else m_stop
+        return map(unpack_move, records[max(0, m_start - 1):max(0, m_stop - 1)])
+
+    def compute_full_sequence(self, rods, target):
+        '''
+        Same as calculate_solution.compute_full_sequence, with the moves taken from the cache.
+        Output:
+            - seq: a binary_solution.MoveSequence, giving the moves as seq[m] = [r, x, y]
+        '''
+        return MoveSequence.from_records(self.records(rods, target))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def close(self):
+        if self._store is not None:
+            self._store.close()
+            self._store = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import sqlite3
+import sys
+import zlib
+from datetime import datetime
+from binary_solution import MoveSequence, iter_packed_chunks
+from calculate_solution import SOLVER_VERSION, SolutionRecipe
+
+
+STORE_EXTENSIONS = (".db", ".sqlite")
+
+
+def _state_key(rods):
+    '''
+    Input:
+        - rods: a dictionary, in the form {1: <list>, 2: <list>, 3: <list>}
+    Output:
+        - the compact JSON text of the rods state, used as lookup key
+    '''
+    return json.dumps({"1": list(rods[1]), "2": list(rods[2]), "3": list(rods[3])}, separators = (",", ":"))
+
+
+class SolutionStore:
+    '''
+    Indexed solution store backed by SQLite. Every solution is one row, with its moves packed as 16-bit records
+    (see binary_solution.pack_move), so saving appends a single row and loading reads a single row, no matter how
+    many solutions are stored. Solutions can be looked up by number or by (initial_state, target).
+    '''
+
+    def __init__(self, file = "solutions.db"):
+        self.file = file
+        self._db = sqlite3.connect(file)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS solutions (
+                number INTEGER PRIMARY KEY,
+                timestamp TEXT,
+                initial_state TEXT NOT NULL,
+                target INTEGER NOT NULL,
+                total_moves INTEGER NOT NULL,
+                moves BLOB NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS solutions_problem ON solutions (initial_state, target);
+            CREATE TABLE IF NOT EXISTS imported_files (file TEXT PRIMARY KEY);
+        """)
+
+    def append(self, rods, target, seq, timestamp = None, number = None):
+        '''
+        Input:
+            - rods: a dictionary, in the form {1: <list>, 2: <list>, 3: <list>}
+            - target: the number of the target rod
+            - seq: a dictionary, in the form {m1: [r1, x1, y1], m2: [r2, x2, y2], ...}, or an iterable of [r, x, y] moves
+            - timestamp: the timestamp of the solution (now, if not given)
+            - number: the number of the solution (the next free number, if not given)
+        Output:
+            - the number of the saved solution
+        '''
+        with self._db:
+            return self._insert(rods, target, seq, timestamp, number)
+
+    def extend(self, solutions):
+        '''
+        Input:
+            - solutions: a list of (rods, target, seq) tuples, in the forms taken by append
+        Output:
+            - the numbers of the saved solutions, given in order within a single transaction
+        '''
+        with self._db:
+            return [self._insert(rods, target, seq, None, None) for rods, target, seq in solutions]
+
+    def append_records(self, rods, target, records, timestamp = None):
+        '''
+        Input:
+            - rods: a dictionary, in the form {1: <list>, 2: <list>, 3: <list>}
+            - target: the number of the target rod
+            - records: the 16-bit little-endian records of the moves (see binary_solution.pack_move), as bytes
+            - timestamp: the timestamp of the solution (now, if not given)
+        Output:
+            - the number of the saved solution
+        '''
+        with self._db:
+            return self._insert_records(rods, target, bytes(records), timestamp, None)
+
+    def _insert(self, rods, target, seq, timestamp, number):
+        moves = b"".join(records.tobytes() for records in iter_packed_chunks(seq))
+        return self._insert_records(rods, target, moves, timestamp, number)
+
+    def _insert_records(self, rods, target, moves, timestamp, number):
+        cursor = self._db.execute(
+            "INSERT INTO solutions (number, timestamp, initial_state, target, total_moves, moves) VALUES (?, ?, ?, ?, ?, ?)",
+            (number, timestamp or datetime.now().isoformat(), _state_key(rods), target, len(moves) // 2, moves))
+        return cursor.lastrowid
+
+    def get(self, number):
+        '''
+        Input:
+            - number: the number of the solution
+        Output:
+            - (initial_state, target, seq, timestamp), with seq a binary_solution.MoveSequence (giving the moves as
+              seq[m] = [r, x, y]), or None if there is no such solution
+        '''
+        row = self._db.execute("SELECT initial_state, target, moves, timestamp FROM solutions WHERE number = ?", (number,)).fetchone()
+        if row is None:
+            return None
+        state, target, moves, timestamp = row
+        state = json.loads(state)
+        seq = MoveSequence.from_records(moves)
+        return {1: state["1"], 2: state["2"], 3: state["3"]}, target, seq, timestamp
+
+    def get_records(self, number):
+        '''
+        Input:
+            - number: the number of the solution
+        Output:
+            - the 16-bit little-endian records of the moves of the solution, as bytes, or None if there is no such solution
+        '''
+        row = self._db.execute("SELECT moves FROM solutions WHERE number = ?", (number,)).fetchone()
+        return None if row is None else row[0]
+
+    def find(self, rods, target):
+        '''
+        Input:
+            - rods: a dictionary, in the form {1: <list>, 2: <list>, 3: <list>}
+            - target: the number of the target rod
+        Output:
+            - the numbers of the stored solutions of the problem, in increasing order
+        '''
+        rows = self._db.execute("SELECT number FROM solutions WHERE initial_state = ? AND target = ? ORDER BY number",
+                                (_state_key(rods), target))
+        return [number for number, in rows]
+
+    def numbers(self):
+        '''
+        Output:
+            - the numbers of all the stored solutions, in increasing order
+        '''
+        return [number for number, in self._db.execute("SELECT number FROM solutions ORDER BY number")]
+
+    def import_json(self, file = "solutions.json"):
+        '''
+        Import the solutions of a JSON file (in the format written by utils.save_solution, the recipes being expanded
+        into their moves), keeping their numbers. The recipes made by another solver version (see
+        calculate_solution.SOLVER_VERSION), or whose expanded moves do not match their checksum, are skipped and reported.
+        A file is only imported once; importing it again does nothing. Nothing is imported, and ValueError is raised,
+        if some numbers of the file are already taken by solutions of the store.
+        Input:
+            - file: the JSON file's name to import the solutions from
+        Output:
+            - the number of imported solutions
+        '''
+        if self._db.execute("SELECT 1 FROM imported_files WHERE file = ?", (file,)).fetchone():
+            return 0
+        with open(file, "r") as f:
+            solutions = json.load(f).get("solutions", {})
+        taken = sorted(set(self.numbers()).intersection(int(num) for num in solutions if num.isdigit()))
+        if taken:
+            raise ValueError(f"the solutions {', '.join(f'#{num}' for num in taken)} of {file} are already in the store")
+        imported = 0
+        with self._db:
+            for num, solution in solutions.items():
+                state = solution["initial_state"]
+                rods = {1: state["1"], 2: state["2"], 3: state["3"]}
+                number = int(num) if num.isdigit() else None
+                recipe = solution.get("moves_recipe")
+                if recipe is not None:
+                    if recipe["version"] != SOLVER_VERSION:
+                        print(f"❌ #{num}: made by the solver version {recipe['version']}, the current one is {SOLVER_VERSION}, skipped!")
+                        continue
+                    seq = SolutionRecipe(rods, solution["target"], recipe["checksum"], recipe["version"], solution.get("total_moves"))
+                    moves = b"".join(records.tobytes() for records in iter_packed_chunks(seq))
+                    if zlib.crc32(moves) != recipe["checksum"]:
+                        print(f"❌ #{num}: the moves of the solver do not match the checksum of the recipe, skipped!")
+                        continue
+                    self._insert_records(rods, solution["target"], moves, solution.get("timestamp"), number)
+                else:
+                    seq = {int(m): move for m, move in solution["moves_sequence"].items()}
+                    self._insert(rods, solution["target"], seq, solution.get("timestamp"), number)
+                imported += 1
+            self._db.execute("INSERT INTO imported_files (file) VALUES (?)", (file,))
+        return imported
+
+    def __len__(self):
+        return self._db.execute("SELECT COUNT(*) FROM solutions").fetchone()[0]
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Tower of Hanoi Solution Store")
+    parser.add_argument("store", help = "The SQLite store file (e.g. solutions.db).")
+    parser.add_argument("--import-json", dest = "json_file", default = "solutions.json",
+                        help = "The JSON file to import the solutions from (default: solutions.json).")
+    args = parser.parse_args()
+    with SolutionStore(args.store) as store:
+        try:
+            imported = store.import_json(args.json_file)
+        except (OSError, ValueError, sqlite3.Error) as e:
+            print(f"❌ Failed to import {args.json_file} to {args.store}: {e}!")
+            sys.exit(1)
+        if imported:
+            print(f"✅ Imported {imported} solution(s) from {args.json_file} to {args.store}!")
+        else:
+            print(f"⚠️  {args.json_file} has already been imported to {args.store}.")
@@ -1,16 +1,20 @@
 #!/usr/bin/env python3
 import sys
 import json
-from calculate_solution import compute_full_sequence
-from utils import save_solution
+import time
+import instrumentation
+from concurrent.futures import ProcessPoolExecutor
+from calculate_solution import compute_full_sequence, iter_full_sequence
+from utils import save_solution, save_solutions
 
 
-def solve_problems(problem_numbers):
+def solve_problems(problem_numbers, recipe = False):
     """
     Solve specified problems from problems.json and save solutions
     
     Args:
         problem_numbers: list of problem numbers to solve
+        recipe: whether to save only the recipes of the solutions instead of their moves
     """
     if not problem_numbers:
         print("❌ No problem numbers provided!")
@@ -61,12 +65,14 @@ def solve_problems(problem_numbers):
                 print(f"🎯 Target rod: {target}")
                 
                 # Solve the problem
+                start = time.perf_counter()
                 seq = compute_full_sequence(initial_state, target)
                 
                 if seq:
                     print(f"📊 Total moves: {len(seq)}")
+                    print(f"⏱️  Wall time: {time.perf_counter() - start:.3f} s")
                     # Save solution
-                    if save_solution(initial_state, target, seq):
+                    if save_solution(initial_state, target, seq, recipe = recipe):
                         print(f"✅ Problem #{problem_num} solved and saved!")
                         solved_count += 1
                         correct_solutions.append(problem_num)
@@ -105,6 +111,108 @@ def solve_problems(problem_numbers):
     except Exception as e:
         print(f"❌ Unexpected error: {e}")
 
+def _solve_problem(initial_state, target):
+    """
+    Worker of solve_problems_parallel: solve one problem and measure its wall time
+
+    Args:
+        initial_state: the rods state of the problem, in the form {1: <list>, 2: <list>, 3: <list>}
+        target: the number of the target rod
+
+    Returns:
+        the list of (r, x, y) moves of the solution and the wall time spent solving it, in seconds
+    """
+    start = time.perf_counter()
+    moves = list(iter_full_sequence(initial_state, target))
+    return moves, time.perf_counter() - start
+
+def solve_problems_parallel(problem_numbers, jobs, recipe = False):
+    """
+    Solve specified problems from problems.json in a pool of worker processes, and save all the solutions
+    with a single write, numbered in the order the problems were given
+    
+    Args:
+        problem_numbers: list of problem numbers to solve
+        jobs: number of worker processes
+        recipe: whether to save only the recipes of the solutions instead of their moves
+    """
+    if not problem_numbers:
+        print("❌ No problem numbers provided!")
+        print("Usage: python solve_problems.py --jobs N 1 2 3 ...")
+        return
+    
+    try:
+        # Load problems
+        with open("problems.json", "r") as f:
+            data = json.load(f)
+        
+        if "problems" not in data:
+            print("❌ No problems found in problems.json!")
+            return
+        
+        problems = data["problems"]
+        print(f"🔧 Solving {len(problem_numbers)} problem(s) with {jobs} worker(s): {', '.join(problem_numbers)}")
+        print("=" * 60)
+        
+        correct_solutions = []
+        wrong_solutions = []
+        solutions = []
+        start = time.perf_counter()
+        
+        with ProcessPoolExecutor(max_workers = jobs) as pool:
+            futures = {}
+            for problem_num in problem_numbers:
+                if problem_num not in problems:
+                    continue
+                problem = problems[problem_num]
+                initial_state = {
+                    1: problem["initial_state"]["1"],
+                    2: problem["initial_state"]["2"], 
+                    3: problem["initial_state"]["3"]
+                }
+                futures[problem_num] = (initial_state, problem["target"], pool.submit(_solve_problem, initial_state, problem["target"]))
+            
+            # Collect the results in the given order, so the numbering of the saved solutions is stable
+            for problem_num in problem_numbers:
+                if problem_num not in futures:
+                    print(f"❌ Problem #{problem_num} not found!")
+                    wrong_solutions.append(problem_num)
+                    continue
+                initial_state, target, future = futures[problem_num]
+                try:
+                    moves, wall_time = future.result()
+                    print(f"🎯 Problem #{problem_num}: {len(moves)} moves in {wall_time:.3f} s")
+                    solutions.append((initial_state, target, moves))
+                    correct_solutions.append(problem_num)
+                except Exception as e:
+                    print(f"❌ Error solving Problem #{problem_num}: {e}")
+                    wrong_solutions.append(problem_num)
+        
+        solve_time = time.perf_counter() - start
+        if solutions and save_solutions(solutions, recipe = recipe) is None:
+            wrong_solutions += correct_solutions
+            correct_solutions = []
+        
+        # Summary
+        print("\n" + "=" * 60)
+        print("📊 SOLVING SUMMARY")
+        print("=" * 60)
+        print(f"✅ Solved: {len(correct_solutions)} ->    ({', '.join(correct_solutions)})")
+        print(f"❌ Failed: {len(wrong_solutions)} ->    ({', '.join(wrong_solutions)})")
+        print(f"⏱️  Wall time: {solve_time:.3f} s solving, {time.perf_counter() - start - solve_time:.3f} s saving")
+        
+        if not wrong_solutions:
+            print("\n🎉 All problems solved successfully!")
+        else:
+            print(f"\n⚠️  {len(wrong_solutions)} problem(s) failed to solve!")
+            
+    except FileNotFoundError:
+        print("❌ problems.json file not found!")
+    except json.JSONDecodeError:
+        print("❌ Invalid JSON format in problems.json!")
+    except Exception as e:
+        print(f"❌ Unexpected error: {e}")
+
 def main():
     """Main function to handle command line arguments"""
     if len(sys.argv) < 2:
@@ -116,9 +224,32 @@ def main():
         print("  • Specific numbers: python solve_problems.py 1 3 5")
         print("  • All problems: python solve_problems.py all")
         print("  • Range: python solve_problems.py 1-5")
+        print("  • Parallel: python solve_problems.py --jobs 4 all")
+        print("  • Profiling: python solve_problems.py --profile=report.json --cprofile=run.prof all")
+        print("  • Recipes only: python solve_problems.py --recipe all")
         return
     
-    args = sys.argv[1:]
+    args = instrumentation.enable_from_args(sys.argv[1:])
+    # Handle the recipe mode, saving the recipes of the solutions instead of their moves
+    recipe = "--recipe" in args
+    args = [arg for arg in args if arg != "--recipe"]
+    if not args:
+        print("❌ No problem numbers provided!")
+        return
+    
+    # Handle the number of worker processes
+    jobs = 1
+    if args[0] in ("-j", "--jobs"):
+        try:
+            jobs = int(args[1])
+            args = args[2:]
+        except (IndexError, ValueError):
+            print("❌ The number of jobs must be an integer!")
+            print("Expected format: --jobs 4")
+            return
+        if jobs < 1 or not args:
+            print("❌ Give a positive number of jobs followed by the problem numbers!")
+            return
     
     # Handle special cases
     if len(args) == 1:
@@ -154,7 +285,10 @@ def main():
         problem_numbers = args
     
     # Solve problems
-    solve_problems(problem_numbers)
+    if jobs > 1:
+        solve_problems_parallel(problem_numbers, jobs, recipe)
+    else:
+        solve_problems(problem_numbers, recipe)
 
 if __name__ == "__main__":
     main()
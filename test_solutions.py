@@ -1,7 +1,11 @@
 #!/usr/bin/env python3
 import sys
 import json
-from utils import load_solution, verify_solution
+import time
+import instrumentation
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from calculate_solution import SOLVER_VERSION, SolutionRecipe
+from utils import iter_saved_solutions, load_solution, verify_solution
 
 
 def test_solutions(solution_numbers):
@@ -45,8 +49,16 @@ def test_solutions(solution_numbers):
             print("🔧 Verifying solution...")
             
             # Convert string keys to integers for verify_solution
-            int_seq = {int(k): v for k, v in seq.items()}
-            is_valid = verify_solution(initial_state, int_seq, target)
+            if isinstance(seq, dict):
+                seq = {int(k): v for k, v in seq.items()}
+            is_valid = True
+            if isinstance(seq, SolutionRecipe):
+                # Recipes hold no moves: check that the solver still generates the moves they were saved with
+                print("🔧 Checking the recipe checksum...")
+                is_valid = seq.is_intact()
+                if not is_valid:
+                    print("❌ The moves generated by the solver do not match the checksum of the recipe!")
+            is_valid = is_valid and verify_solution(initial_state, seq, target)
             
             if is_valid:
                 print(f"✅ Solution #{sol_num} is VALID!")
@@ -75,6 +87,102 @@ def test_solutions(solution_numbers):
     else:
         print(f"\n⚠️  {failed} solution(s) failed verification!")
 
+def _verify_solution(initial_state, target, moves):
+    """
+    Worker of test_solutions_parallel: verify one solution quietly and measure its wall time
+
+    Args:
+        initial_state: the rods state of the solution, in the form {1: <list>, 2: <list>, 3: <list>}
+        target: the number of the target rod
+        moves: the MoveSequence of the moves of the solution, or its SolutionRecipe
+
+    Returns:
+        whether the solution is valid and the wall time spent verifying it, in seconds
+    """
+    start = time.perf_counter()
+    is_valid = not isinstance(moves, SolutionRecipe) or moves.is_intact()
+    is_valid = is_valid and verify_solution(initial_state, moves, target, verbose = False)
+    return is_valid, time.perf_counter() - start
+
+def test_solutions_parallel(solution_numbers, jobs, file = "solutions.json"):
+    """
+    Test specified solutions in a pool of worker processes, parsing the solutions file only once
+    and printing one compact line per solution as soon as it is verified
+    
+    Args:
+        solution_numbers: list of solution numbers to test (None for all the solutions of the file)
+        jobs: number of worker processes
+        file: the JSON file's name to load the solutions from
+    """
+    start = time.perf_counter()
+    try:
+        # The file is read incrementally, keeping the moves of the solutions to test packed in MoveSequences
+        wanted = None if solution_numbers is None else set(solution_numbers)
+        solutions = dict(iter_saved_solutions(file, wanted))
+    except FileNotFoundError:
+        print(f"❌ {file} file not found!")
+        return
+    except json.JSONDecodeError:
+        print(f"❌ Invalid JSON format in {file}!")
+        return
+    if solution_numbers is None:
+        solution_numbers = list(solutions.keys())
+    parse_time = time.perf_counter() - start
+    
+    print(f"Testing {len(solution_numbers)} solution(s) with {jobs} worker(s), {file} parsed in {parse_time:.3f} s")
+    print("=" * 60)
+    
+    correct_solutions = []
+    wrong_solutions = []
+    
+    with ProcessPoolExecutor(max_workers = jobs) as pool:
+        futures = {}
+        for sol_num in solution_numbers:
+            if sol_num not in solutions:
+                print(f"❌ #{sol_num}: not found")
+                wrong_solutions.append(sol_num)
+                continue
+            solution = solutions[sol_num]
+            initial_state = {
+                1: solution["initial_state"]["1"],
+                2: solution["initial_state"]["2"],
+                3: solution["initial_state"]["3"]
+            }
+            recipe = solution.get("moves_recipe")
+            if recipe is not None:
+                if recipe["version"] != SOLVER_VERSION:
+                    print(f"❌ #{sol_num}: made by the solver version {recipe['version']}")
+                    wrong_solutions.append(sol_num)
+                    continue
+                moves = SolutionRecipe(initial_state, solution["target"], recipe["checksum"], recipe["version"], solution.get("total_moves"))
+            else:
+                moves = solution["moves_sequence"]
+            futures[pool.submit(_verify_solution, initial_state, solution["target"], moves)] = (sol_num, len(moves))
+        
+        for future in as_completed(futures):
+            sol_num, total_moves = futures[future]
+            try:
+                is_valid, wall_time = future.result()
+            except Exception as e:
+                print(f"❌ #{sol_num}: error {e}")
+                wrong_solutions.append(sol_num)
+                continue
+            print(f"{'✅' if is_valid else '❌'} #{sol_num}: {total_moves} moves in {wall_time:.3f} s")
+            (correct_solutions if is_valid else wrong_solutions).append(sol_num)
+    
+    # Summary
+    print("\n" + "=" * 60)
+    print("📊 TEST SUMMARY")
+    print("=" * 60)
+    print(f"✅ Passed: {len(correct_solutions)} ->    ({', '.join(sorted(correct_solutions, key = solution_numbers.index))})")
+    print(f"❌ Failed: {len(wrong_solutions)} ->    ({', '.join(sorted(wrong_solutions, key = solution_numbers.index))})")
+    print(f"⏱️  Wall time: {time.perf_counter() - start:.3f} s")
+    
+    if not wrong_solutions:
+        print("\n🎉 All solutions are valid!")
+    else:
+        print(f"\n⚠️  {len(wrong_solutions)} solution(s) failed verification!")
+
 def main():
     """Main function to handle command line arguments"""
     if len(sys.argv) < 2:
@@ -86,9 +194,32 @@ def main():
         print("  • Specific numbers: python test_solutions.py 1 3 5")
         print("  • All solutions: python test_solutions.py all")
         print("  • Range: python test_solutions.py 1-5")
+        print("  • Parallel: python test_solutions.py --jobs 4 all")
+        print("  • Profiling: python test_solutions.py --profile=report.json --cprofile=run.prof all")
         return
     
-    args = sys.argv[1:]
+    args = instrumentation.enable_from_args(sys.argv[1:])
+    if not args:
+        print("❌ No solution numbers provided!")
+        return
+    
+    # Handle the number of worker processes
+    jobs = 1
+    if args[0] in ("-j", "--jobs"):
+        try:
+            jobs = int(args[1])
+            args = args[2:]
+        except (IndexError, ValueError):
+            print("❌ The number of jobs must be an integer!")
+            print("Expected format: --jobs 4")
+            return
+        if jobs < 1 or not args:
+            print("❌ Give a positive number of jobs followed by the solution numbers!")
+            return
+        if args == ["all"]:
+            # The parallel mode parses solutions.json only once, to find and to load the solutions
+            test_solutions_parallel(None, jobs)
+            return
     
     # Handle special cases
     if len(args) == 1:
@@ -124,7 +255,10 @@ def main():
         solution_numbers = args
     
     # Test solutions
-    test_solutions(solution_numbers)
+    if jobs > 1:
+        test_solutions_parallel(solution_numbers, jobs)
+    else:
+        test_solutions(solution_numbers)
 
 if __name__ == "__main__":
     main()
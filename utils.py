@@ -1,22 +1,34 @@
+import contextlib
+import io
 import json
+import os
+import re
+import sys
+import tempfile
+from collections import deque
+from contextlib import ExitStack
 from datetime import datetime
+from itertools import chain, islice
+import instrumentation
+from binary_solution import BINARY_EXTENSION, BinarySolution, MoveSequence, save_binary_solution, sequence_checksum, unpack_move
+from calculate_solution import SOLVER_VERSION, SolutionRecipe
+from solution_store import STORE_EXTENSIONS, SolutionStore
 
 
 def is_valid_rods_state(rods):
     '''
     Input:
-        - rods: a dictionary, in the form {1: <list>, 2: <list>, 3: <list>}
+        - rods: a dictionary, in the form {1: <list>, 2: <list>, 3: <list>} (or {1: <list>, ..., k: <list>} for k rods)
             - 1: the state of the first (left) rod, represented as a list of rings ordered from bottom to top
             - 2: the state of the second (middle) rod, represented as a list of rings ordered from bottom to top
             - 3: the state of the third (right) rod, represented as a list of rings ordered from bottom to top
     Output:
         - a boolean indicating if the rods state given is valid
     '''
-    r1, r2, r3 = rods[1], rods[2], rods[3]
-    r = r1 + r2 + r3
-    rods_list = [("1", r1), ("2", r2), ("3", r3)]
+    rods_list = [(str(rod), rods[rod]) for rod in sorted(rods)]
+    r = [ring for name, rk in rods_list for ring in rk]
     total_rings = sum(len(rk) for name, rk in rods_list)
-    invalid_rods_order = r1[::-1] != sorted(r1) or r2[::-1] != sorted(r2) or r3[::-1] != sorted(r3)
+    invalid_rods_order = any(rk[::-1] != sorted(rk) for name, rk in rods_list)
     invalid_rings_given = sorted(r) != list(range(1, len(r) + 1))
     if total_rings == 0:
         print("❌ At least one ring must be placed on a rod!")
@@ -29,56 +41,319 @@ def is_valid_rods_state(rods):
         return False
     return True
 
-def print_solution(seq):
+def parse_rods(data):
     '''
+    Read and validate a rods state given as JSON, with the checks of is_valid_rods_state.
     Input:
-        - seq: a dictionary, in the form {m1: [r1, x1, y1], m2: [r2, x2, y2], ...}
+        - data: the decoded JSON rods state, in the form {"1": <list>, "2": <list>, "3": <list>} (as in problems.json)
+    Output:
+        - rods: a dictionary, in the form {1: <list>, 2: <list>, 3: <list>}, or None if the state is not valid
+        - error: None, or the reason why the state is not valid
+    '''
+    if not isinstance(data, dict):
+        return None, "❌ The rods state must be an object {\"1\": [...], \"2\": [...], \"3\": [...]}!"
+    if not all(key in ("1", "2", "3") or (type(key) is int and key in (1, 2, 3)) for key in data):
+        return None, "❌ The rods state must only have the rods \"1\", \"2\" and \"3\"!"
+    rods = {rod: data.get(str(rod), data.get(rod, [])) for rod in (1, 2, 3)}
+    if not all(isinstance(rings, list) and all(type(ring) is int for ring in rings) for rings in rods.values()):
+        return None, "❌ The rings of every rod must be given as a list of integers!"
+    messages = io.StringIO()
+    with contextlib.redirect_stdout(messages):
+        is_valid = is_valid_rods_state(rods)
+    if not is_valid:
+        return None, messages.getvalue().strip()
+    return rods, None
+
+def print_solution(seq, first_move = 1):
+    '''
+    Input:
+        - seq: a dictionary, in the form {m1: [r1, x1, y1], m2: [r2, x2, y2], ...}, a binary_solution.MoveSequence, or an iterable of [r, x, y] moves
             - m: the number of the move
             - r: the number of the ring that moves during the transition of move m
             - x: the number of the rod from which the transition of move m starts
             - y: the number of the rod to which the transition of move m ends
+        - first_move: the number of the first move of seq (e.g. when seq holds a range of moves of a solution)
     '''
     print()
-    for m in range(1, len(seq) + 1):
-        print(f"{m}:  {int(seq[m][1])} -> {int(seq[m][2])} ({int(seq[m][0])})")
+    write_solution(seq, first_move = first_move)
+
+_OUTPUT_FORMATS = {
+    "text": "{0}:  {2} -> {3} ({1})\n",
+    "csv": "{0},{1},{2},{3}\n",
+    "jsonl": '{{"move": {0}, "ring": {1}, "from": {2}, "to": {3}}}\n'
+}
 
-def verify_solution(rods, seq, target):
+@instrumentation.stage("write_solution")
+def write_solution(seq, out = None, fmt = "text", first_move = 1, chunk = 2**14):
+    '''
+    Write the moves in bulk, formatting and writing them in chunks instead of once per move.
+    Input:
+        - seq: a dictionary, in the form {m1: [r1, x1, y1], m2: [r2, x2, y2], ...}, a binary_solution.MoveSequence, or an iterable of [r, x, y] moves
+        - out: the text stream to write to (sys.stdout, if not given); binary output goes to its underlying buffer
+        - fmt: the output format
+            - "text": the human readable "m:  x -> y (r)" lines of print_solution
+            - "csv": a "move,ring,from,to" header, then one line per move
+            - "jsonl": one {"move": m, "ring": r, "from": x, "to": y} object per line
+            - "binary": 3 raw bytes (r, x, y) per move, for up to 255 rings
+        - first_move: the number of the first move of seq (e.g. when seq holds a range of moves of a solution)
+        - chunk: the number of moves formatted and written at once
+    '''
+    out = sys.stdout if out is None else out
+    moves = iter_moves(seq)
+    if fmt == "binary":
+        out.flush()
+        stream = getattr(out, "buffer", out)
+        while True:
+            try:
+                block = bytes(chain.from_iterable(islice(moves, chunk)))
+            except ValueError:
+                raise ValueError("the binary format supports up to 255 rings") from None
+            if not block:
+                break
+            stream.write(block)
+            if instrumentation.is_enabled():
+                instrumentation.count("write_solution", moves = len(block) // 3, bytes_written = len(block))
+        stream.flush()
+        return
+    template = _OUTPUT_FORMATS[fmt].format
+    if fmt == "csv":
+        out.write("move,ring,from,to\n")
+    m = first_move
+    while True:
+        block = list(islice(moves, chunk))
+        if not block:
+            break
+        text = "".join([template(m + i, r, x, y) for i, (r, x, y) in enumerate(block)])
+        out.write(text)
+        m += len(block)
+        if instrumentation.is_enabled():
+            instrumentation.count("write_solution", moves = len(block), bytes_written = len(text))
+    out.flush()
+
+@instrumentation.stage("verify_solution")
+def verify_solution(rods, seq, target, verbose = True):
     '''
     Input:
         - rods: a dictionary, in the form {1: <list>, 2: <list>, 3: <list>}
             - 1: the state of the first (left) rod, represented as a list of rings ordered from bottom to top
             - 2: the state of the second (middle) rod, represented as a list of rings ordered from bottom to top
             - 3: the state of the third (right) rod, represented as a list of rings ordered from bottom to top
-        - seq: a dictionary, in the form {m1: [r1, x1, y1], m2: [r2, x2, y2], ...}
+        - seq: a dictionary, in the form {m1: [r1, x1, y1], m2: [r2, x2, y2], ...}, a binary_solution.MoveSequence, or an iterable of [r, x, y] moves
             - m: the number of the move
             - r: the number of the ring that moves during the transition of move m
             - x: the number of the rod from which the transition of move m starts
             - y: the number of the rod to which the transition of move m ends
         - target: the number of the target rod
+        - verbose: whether to print the outcome of the verification
     Output:
         - a boolean indicating whether the solution is valid
     '''
-    current_rods = {rod: rings[:] for rod, rings in rods.items()}    
-    for m in range(1, len(seq) + 1):
-        ring, source, dest = seq[m]
-        if not current_rods[source] or current_rods[source][-1] != ring:
-            print(f"❌ Move {m}: Ring {ring} is not on top of rod {source}!")
-            return False
-        if current_rods[dest] and current_rods[dest][-1] < ring:
-            print(f"❌ Move {m}: Cannot place ring {ring} on top of smaller ring {current_rods[dest][-1]} on rod {dest}!")
-            return False
-        current_rods[source].pop()
-        current_rods[dest].append(ring)
-    expected_final = list(range(sum(len(current_rods[rod]) for rod in [1, 2, 3]), 0, -1))
-    if current_rods[target] == expected_final and all(len(current_rods[rod]) == 0 for rod in [1, 2, 3] if rod != target):
-        print(f"✅ Solution is valid! All rings are correctly placed on the target rod {target}!")
+    if isinstance(seq, BinarySolution) and not seq.verify_checksum():
+        if verbose:
+            print("❌ Checksum mismatch! The moves do not match the checksum stored in the binary file!")
+        return False
+    masks = rods_to_masks(rods)
+    if isinstance(seq, MoveSequence) or (isinstance(seq, BinarySolution) and sys.byteorder == "little"):
+        error = play_records(masks, seq.records())
+    else:
+        error = play_moves(masks, iter_moves(seq))
+    if instrumentation.is_enabled() and hasattr(seq, "__len__"):
+        instrumentation.count("verify_solution", moves = len(seq))
+    if error is not None:
+        if verbose:
+            print(error[1])
+        return False
+    total_rings = sum(len(rings) for rings in rods.values())
+    if masks[target] == (1 << total_rings) - 1 and all(masks[rod] == 0 for rod in rods if rod != target):
+        if verbose:
+            print(f"✅ Solution is valid! All rings are correctly placed on the target rod {target}!")
         return True
     else:
-        print("❌ Solution is invalid! Final state does not match expected configuration!")
-        print(f"Expected: Rod {target} = {expected_final}, other rods empty.")
-        print(f"Actual: Rod 1 = {current_rods[1]}, Rod 2 = {current_rods[2]}, Rod 3 = {current_rods[3]}.")
+        if verbose:
+            current_rods = masks_to_rods(masks)
+            print("❌ Solution is invalid! Final state does not match expected configuration!")
+            print(f"Expected: Rod {target} = {list(range(total_rings, 0, -1))}, other rods empty.")
+            print(f"Actual: {', '.join(f'Rod {rod} = {rings}' for rod, rings in current_rods.items())}.")
         return False
 
+def rods_to_masks(rods):
+    '''
+    Input:
+        - rods: a dictionary, in the form {1: <list>, 2: <list>, 3: <list>} (or {1: <list>, ..., k: <list>} for k rods)
+    Output:
+        - masks: a list [0, mask1, mask2, mask3] (or [0, mask1, ..., maskk]), where bit j - 1 of mask k is set if ring j is on rod k
+    '''
+    if min(rods) < 1:
+        raise ValueError(f"the rods must be numbered from 1, not {min(rods)}")
+    masks = [0] * (max(rods) + 1)
+    for rod, rings in rods.items():
+        for ring in rings:
+            masks[rod] |= 1 << (ring - 1)
+    return masks
+
+def masks_to_rods(masks):
+    '''
+    Input:
+        - masks: a list [0, mask1, mask2, mask3] (or [0, mask1, ..., maskk]), as built by rods_to_masks
+    Output:
+        - rods: a dictionary, in the form {1: <list>, 2: <list>, 3: <list>} (or {1: <list>, ..., k: <list>})
+    '''
+    return {rod: [ring for ring in range(masks[rod].bit_length(), 0, -1) if masks[rod] >> (ring - 1) & 1] for rod in range(1, len(masks))}
+
+def play_moves(masks, moves, first_move = 1):
+    '''
+    Play the moves on the rods state kept as bitmasks, checking that each one is legal: rods x and y must exist, ring r
+    is on top of rod x if bit r - 1 is the lowest bit set in mask x, and it can be placed on rod y if no lower bit of
+    mask y is set.
+    Input:
+        - masks: a list [0, mask1, mask2, mask3] (or [0, mask1, ..., maskk]), as built by rods_to_masks, updated in place
+        - moves: an iterable of (r, x, y) moves
+        - first_move: the number of the first move, used in the error message
+    Output:
+        - None if all the moves are legal, otherwise (m, message) for the first illegal move m (the masks are left
+          in the state right before it)
+    '''
+    # The masks are disjoint, so their sum has the bits of all the rings
+    n = sum(masks).bit_length()
+    # Ring numbers below 1 are mapped to ring n + 1, which is never on top of a rod (ring numbers above n raise IndexError)
+    absent = 1 << n
+    bits = [absent] + [1 << (ring - 1) for ring in range(1, n + 1)]
+    # masks[0] is unused, so that rod k is masks[k]: rod numbers outside of 1, ..., k must not index the masks
+    k = len(masks) - 1
+    try:
+        for m, (ring, source, dest) in enumerate(moves, first_move):
+            if not (0 < source <= k and 0 < dest <= k):
+                return m, f"❌ Move {m}: Rod {source if not 0 < source <= k else dest} does not exist!"
+            bit = bits[ring] if ring > 0 else absent
+            mask_source = masks[source]
+            if mask_source & -mask_source != bit:
+                return m, f"❌ Move {m}: Ring {ring} is not on top of rod {source}!"
+            mask_dest = masks[dest]
+            if mask_dest & (bit - 1):
+                return m, f"❌ Move {m}: Cannot place ring {ring} on top of smaller ring {(mask_dest & -mask_dest).bit_length()} on rod {dest}!"
+            masks[source] = mask_source ^ bit
+            masks[dest] = mask_dest | bit
+    except IndexError:
+        return m, f"❌ Move {m}: Ring {ring} is not on top of rod {source}!"
+    return None
+
+def play_records(masks, records, first_move = 1):
+    '''
+    Same as play_moves, for moves packed as 16-bit records (see binary_solution.pack_move), e.g. the memoryview given by
+    binary_solution.BinarySolution.records(). The records are read 4 at a time, as 64-bit integers, and each group of 4
+    moves is checked and played with a single table lookup (see _RecordQuads).
+    Input:
+        - masks: a list [0, mask1, mask2, mask3], as built by rods_to_masks, updated in place
+        - records: a sequence of 16-bit move records in native byte order (e.g. binary_solution.MoveSequence.records())
+        - first_move: the number of the first move, used in the error message
+    Output:
+        - None if all the moves are legal, otherwise (m, message) for the first illegal move m
+    '''
+    n = sum(masks).bit_length()
+    positions = _masks_to_positions(masks)
+    quads = len(records) // 4
+    with memoryview(records) as view, view.cast("B") as data:
+        for start in range(0, quads, 2**14):
+            stop = min(start + 2**14, quads)
+            with data[8 * start:8 * stop] as chunk, chunk.cast("Q") as keys:
+                keys = keys.tolist()
+            chunk_positions = positions
+            for key in keys:
+                low, pattern, delta = _RECORD_QUADS[key]
+                if positions & low != pattern:
+                    break
+                positions ^= delta
+            else:
+                continue
+            # A group of moves of the chunk is illegal, or not covered by the rules (e.g. a move from a rod to itself):
+            # the chunk is played again move by move from its first state, to find and report the illegal move
+            masks[1:4] = _positions_to_masks(chunk_positions, n)
+            error = play_moves(masks, map(unpack_move, records[4 * start:4 * stop]), first_move + 4 * start)
+            if error is not None:
+                return error
+            positions = _masks_to_positions(masks)
+    masks[1:4] = _positions_to_masks(positions, n)
+    return play_moves(masks, map(unpack_move, records[4 * quads:]), first_move + 4 * quads)
+
+def _masks_to_positions(masks):
+    '''
+    Input:
+        - masks: a list [0, mask1, mask2, mask3], as built by rods_to_masks
+    Output:
+        - the rods state as a single integer, with the rod of ring r in the bits 2r - 2 and 2r - 1
+    '''
+    positions = 0
+    for rod in (1, 2, 3):
+        mask = masks[rod]
+        while mask:
+            bit = mask & -mask
+            positions |= rod << 2 * (bit.bit_length() - 1)
+            mask ^= bit
+    return positions
+
+def _positions_to_masks(positions, n):
+    '''
+    Input:
+        - positions: the rods state, as given by _masks_to_positions
+        - n: the total number of rings
+    Output:
+        - the list [mask1, mask2, mask3] of the rods state
+    '''
+    masks = [0, 0, 0, 0]
+    for ring in range(n):
+        masks[positions >> 2 * ring & 3] |= 1 << ring
+    return masks[1:]
+
+def _record_rule(record):
+    '''
+    Input:
+        - record: a 16-bit move record
+    Output:
+        - (low, pattern, delta): the move is legal if positions & low == pattern (ring r is on rod x, and the smaller
+          rings are all on the third rod), and it is played with positions ^= delta (see _masks_to_positions),
+          or None if the record is from or to rod 0, of ring 0, or from a rod to itself (left to play_moves)
+    '''
+    r, x, y = record >> 4, (record >> 2) & 3, record & 3
+    if not (r and x and y and x != y):
+        return None
+    # 0b0101... has a 1 in the low bit of the positions of the rings smaller than r
+    smaller = ((1 << 2 * (r - 1)) - 1) // 3
+    return (1 << 2 * r) - 1, (x << 2 * (r - 1)) | (6 - x - y) * smaller, (x ^ y) << 2 * (r - 1)
+
+class _RecordQuads(dict):
+    '''
+    The rules of the groups of 4 moves read by play_records as 64-bit integers, filled on demand: an optimal solution
+    only has a few distinct groups of 4 moves, whatever its length. The rule (low, pattern, delta) of a group is the
+    union of the rules of its moves, which all only read the positions of the rings up to their own ring, so that
+    the 4 moves are legal if positions & low == pattern, and they are played with positions ^= delta.
+    '''
+    _SHIFTS = (0, 16, 32, 48) if sys.byteorder == "little" else (48, 32, 16, 0)
+    _ILLEGAL = (0, 1, 0)
+
+    def __missing__(self, key):
+        if len(self) >= 2**14:
+            self.clear()
+        low = pattern = delta = 0
+        for shift in self._SHIFTS:
+            rule = _record_rule(key >> shift & 0xFFFF)
+            if rule is None:
+                rule = self._ILLEGAL
+                break
+            move_low, move_pattern, move_delta = rule
+            # The move is checked on the positions after the previous moves of the group
+            move_pattern ^= delta & move_low
+            common = low & move_low
+            if pattern & common != move_pattern & common:
+                rule = self._ILLEGAL
+                break
+            low, pattern, delta = low | move_low, pattern | move_pattern, delta ^ move_delta
+        else:
+            rule = (low, pattern, delta)
+        self[key] = rule
+        return rule
+
+_RECORD_QUADS = _RecordQuads()
+
 def _format_json_mixed(obj, indent = 2, level = 0):
     """
     Recursively format `obj` as JSON:
@@ -102,7 +377,268 @@ def _format_json_mixed(obj, indent = 2, level = 0):
     else:
         return json.dumps(obj)
 
-def save_solution(rods, target, seq, file = "solutions.json"):
+_WRITE_CHUNK = 2**14
+
+def _write_json_mixed(f, reader, indent = 2, level = 0):
+    """
+    Copy the JSON value at the position of `reader` (see _JsonReader) to the open file `f` in the layout of
+    `_format_json_mixed`, one dictionary member at a time, so that the output is the same as
+    `f.write(_format_json_mixed(json.load(...)))` without holding the dictionaries in memory.
+    """
+    if not reader.is_object():
+        f.write(json.dumps(reader.value()))
+        return
+    pad = " " * (indent * (level + 1))
+    is_empty = True
+    for key in reader.members():
+        f.write("{\n" if is_empty else ",\n")
+        f.write(f"{pad}{json.dumps(key)}: ")
+        if key == "moves_sequence" and reader.is_object():
+            _copy_moves_mixed(f, reader, indent, level + 1)
+        else:
+            _write_json_mixed(f, reader, indent, level + 1)
+        is_empty = False
+    f.write("{}" if is_empty else "\n" + " " * (indent * level) + "}")
+
+def _copy_moves_mixed(f, reader, indent = 2, level = 0):
+    """
+    Same as _write_json_mixed for a moves sequence, read with _JsonReader.moves and written _WRITE_CHUNK moves at a time.
+    """
+    pad = " " * (indent * (level + 1))
+    members = reader.moves()
+    is_empty = True
+    while True:
+        lines = []
+        for m, move in islice(members, _WRITE_CHUNK):
+            if m.isdigit() and type(move) is list and len(move) == 3 and all(type(value) is int for value in move):
+                lines.append(f'{pad}"{m}": [{move[0]}, {move[1]}, {move[2]}]')
+            else:
+                lines.append(f"{pad}{json.dumps(m)}: {_format_json_mixed(move, indent, level + 1)}")
+        if not lines:
+            break
+        f.write(("{\n" if is_empty else ",\n") + ",\n".join(lines))
+        is_empty = False
+    f.write("{}" if is_empty else "\n" + " " * (indent * level) + "}")
+
+def _write_moves_mixed(f, moves, total_moves, indent = 2, level = 0):
+    """
+    Stream a moves sequence to the open file `f` in the same layout `_format_json_mixed` gives to the dictionary
+    {"1": [r1, x1, y1], "2": [r2, x2, y2], ...}, _WRITE_CHUNK moves at a time.
+    """
+    if total_moves == 0:
+        f.write("{}")
+        return
+    pad = " " * (indent * (level + 1))
+    f.write("{\n")
+    moves = iter(moves)
+    for start in range(1, total_moves + 1, _WRITE_CHUNK):
+        lines = [f'{pad}"{m}": [{r}, {x}, {y}]' for m, (r, x, y) in enumerate(islice(moves, _WRITE_CHUNK), start)]
+        f.write(",\n".join(lines) + (",\n" if start + _WRITE_CHUNK <= total_moves else "\n"))
+    f.write(" " * (indent * level) + "}")
+
+class _JsonReader:
+    """
+    Incremental reader of a JSON file: the text is read by chunks into a buffer, and the values are decoded one at a
+    time, so that a dictionary can be walked member by member (see members) without being held in memory.
+    """
+    _WHITESPACE = re.compile(r"[ \t\n\r]*")
+    _DECODER = json.JSONDecoder()
+    # Runs of text without braces outside of the strings, to skip over dictionaries without decoding them
+    _SKIPPED = re.compile(r'(?:[^{}"]+|"(?:[^"\\]|\\.)*")*')
+    # A member of a moves sequence, in the layout written by _write_moves_mixed (with any whitespace)
+    _MOVE = re.compile(r'[ \t\n\r]*"(\d+)"[ \t\n\r]*:[ \t\n\r]*\[[ \t\n\r]*(\d+)[ \t\n\r]*,[ \t\n\r]*(\d+)[ \t\n\r]*,'
+                       r'[ \t\n\r]*(\d+)[ \t\n\r]*\][ \t\n\r]*([,}])')
+    _MAX_MOVE_LENGTH = 256
+
+    def __init__(self, f, chunk = 2**16):
+        self._f = f
+        self._chunk = chunk
+        self._buffer = ""
+        self._pos = 0
+        self._is_eof = False
+
+    def _fill(self):
+        # Values that do not fit the buffer double the reads, so that decoding them again stays linear
+        data = self._f.read(max(self._chunk, len(self._buffer) - self._pos))
+        self._buffer = self._buffer[self._pos:] + data
+        self._pos = 0
+        self._is_eof = not data
+        return bool(data)
+
+    def _peek(self):
+        while True:
+            self._pos = self._WHITESPACE.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                return ""
+
+    def _expect(self, char):
+        if self._peek() != char:
+            raise json.JSONDecodeError(f"Expecting {char!r}", self._buffer, self._pos)
+        self._pos += 1
+
+    def is_object(self):
+        return self._peek() == "{"
+
+    def is_at_end(self):
+        return self._peek() == ""
+
+    def value(self):
+        '''
+        Output:
+            - the JSON value at the current position, decoded entirely
+        '''
+        self._peek()
+        while True:
+            try:
+                value, end = self._DECODER.raw_decode(self._buffer, self._pos)
+                # A number at the end of the buffer may go on in the next chunk
+                if end < len(self._buffer) or self._is_eof:
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._is_eof:
+                    raise
+            self._fill()
+
+    def members(self):
+        '''
+        Output:
+            - a generator of the keys of the dictionary at the current position; the value of every key must be read
+              (with value, members or skip) before asking for the next key
+        '''
+        self._expect("{")
+        if self._peek() == "}":
+            self._pos += 1
+            return
+        while True:
+            key = self.value()
+            self._expect(":")
+            yield key
+            char = self._peek()
+            self._pos += 1
+            if char == "}":
+                return
+            if char != ",":
+                raise json.JSONDecodeError("Expecting ',' delimiter", self._buffer, self._pos - 1)
+
+    def moves(self):
+        '''
+        Same as members, for a moves sequence: the members in the layout written by _write_moves_mixed are matched
+        with a regular expression instead of being decoded one value at a time.
+        Output:
+            - a generator of the (m, [r, x, y]) members of the moves sequence at the current position, with m a string
+        '''
+        self._expect("{")
+        if self._peek() == "}":
+            self._pos += 1
+            return
+        while True:
+            match = self._MOVE.match(self._buffer, self._pos)
+            if (match is None or match.end() == len(self._buffer)) and not self._is_eof \
+                    and len(self._buffer) - self._pos < self._MAX_MOVE_LENGTH:
+                self._fill()
+                continue
+            if match is not None:
+                self._pos = match.end()
+                yield match[1], [int(match[2]), int(match[3]), int(match[4])]
+                char = match[5]
+            else:
+                key = self.value()
+                self._expect(":")
+                yield key, self.value()
+                char = self._peek()
+                self._pos += 1
+            if char == "}":
+                return
+            if char != ",":
+                raise json.JSONDecodeError("Expecting ',' delimiter", self._buffer, self._pos - 1)
+
+    def skip(self):
+        '''
+        Move past the value at the current position; dictionaries are skipped by matching their braces, without
+        decoding their members.
+        '''
+        if not self.is_object():
+            self.value()
+            return
+        depth = 0
+        while True:
+            self._pos = self._SKIPPED.match(self._buffer, self._pos).end()
+            if self._pos == len(self._buffer) or self._buffer[self._pos] == '"':
+                # The end of the buffer, possibly in the middle of a string
+                if not self._fill():
+                    raise json.JSONDecodeError("Unterminated object", self._buffer, self._pos)
+                continue
+            depth += 1 if self._buffer[self._pos] == "{" else -1
+            self._pos += 1
+            if depth == 0:
+                return
+
+    def find(self, name):
+        '''
+        Input:
+            - name: the key to look for in the dictionary at the current position
+        Output:
+            - a boolean indicating whether the key was found, in which case the reader is left on its value
+        '''
+        for key in self.members():
+            if key == name:
+                return True
+            self.skip()
+        return False
+
+def _read_solution(reader):
+    '''
+    Input:
+        - reader: a _JsonReader on a solution written by save_solution
+    Output:
+        - the solution as a dictionary, with its "moves_sequence" read into a binary_solution.MoveSequence (or into a
+          dictionary {m: [r, x, y]}, if some moves cannot be packed, so that verify_solution reports them)
+    '''
+    solution = {}
+    for key in reader.members():
+        if key == "moves_sequence" and reader.is_object():
+            seq = MoveSequence()
+            for m, move in reader.moves():
+                if m != str(len(seq) + 1):
+                    raise ValueError(f"move {m} is out of order")
+                if isinstance(seq, MoveSequence):
+                    try:
+                        seq.append(move)
+                        continue
+                    except (TypeError, ValueError):
+                        seq = dict(seq.items())
+                seq[len(seq) + 1] = move
+            solution[key] = seq
+        else:
+            solution[key] = reader.value()
+    return solution
+
+def iter_saved_solutions(file = "solutions.json", numbers = None):
+    '''
+    Read the solutions of a JSON file (in the format written by save_solution) one at a time, keeping only the solution
+    being read in memory, with its moves packed in a binary_solution.MoveSequence.
+    Input:
+        - file: the JSON file's name to read the solutions from
+        - numbers: the keys of the solutions to read (None for all of them), the others are skipped without decoding their moves
+    Output:
+        - a generator of the (number, solution) of the solutions of the file, where number is the key of the solution
+          and solution is a dictionary with its "initial_state", "target", "total_moves", "moves_sequence" (or "moves_recipe")...
+    '''
+    with open(file, "r") as f:
+        reader = _JsonReader(f)
+        if not reader.find("solutions"):
+            return
+        for num in reader.members():
+            if numbers is None or num in numbers:
+                yield num, _read_solution(reader)
+            else:
+                reader.skip()
+
+@instrumentation.stage("save_solution")
+def save_solution(rods, target, seq, file = "solutions.json", recipe = False):
     """
     Save solution to JSON file with numbered indications like problems.json
     Input:
@@ -111,52 +647,248 @@ def save_solution(rods, target, seq, file = "solutions.json"):
             - 2: the state of the second (middle) rod, represented as a list of rings ordered from bottom to top
             - 3: the state of the third (right) rod, represented as a list of rings ordered from bottom to top
         - target: the number of the target rod
-        - seq: a dictionary, in the form {m1: [r1, x1, y1], m2: [r2, x2, y2], ...}
+        - seq: a dictionary, in the form {m1: [r1, x1, y1], m2: [r2, x2, y2], ...}, a binary_solution.MoveSequence, or an iterable of [r, x, y] moves
             - m: the number of the move
             - r: the number of the ring that moves during the transition of move m
             - x: the number of the rod from which the transition of move m starts
             - y: the number of the rod to which the transition of move m ends
-        - file: the JSON file's name to save the solution to
+        - file: the JSON file's name to save the solution to (or a binary file, see binary_solution.save_binary_solution,
+          if its name ends with .hnb, or an SQLite store, see solution_store.SolutionStore, if it ends with .db or .sqlite)
+        - recipe: whether to store only the recipe of the solution (see calculate_solution.SolutionRecipe) instead of
+          its moves, for the optimal solutions given by compute_full_sequence (binary files and SQLite stores always
+          hold the moves)
     Output:
         - a boolean indicating whether the solution has been saved successfully
     """
+    if recipe:
+        seq = as_recipe(rods, target, seq)
+        if seq is None:
+            return False
+    size_before = _stored_size(file)
+    if file.endswith(BINARY_EXTENSION):
+        is_saved = save_binary_solution(rods, target, seq, file)
+        _count_saved("save_solution", file, size_before, 1 if is_saved else 0)
+        return is_saved
     try:
-        try:
-            with open(file, "r") as f:
-                existing_data = json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            existing_data = {"solutions": {}}
-        if "solutions" not in existing_data:
-            existing_data["solutions"] = {}
-        solution_numbers = [int(num) for num in existing_data["solutions"].keys() if str(num).isdigit()]
-        next_number = max(solution_numbers) + 1 if solution_numbers else 1
-        solution_data = {
-            "timestamp": datetime.now().isoformat(),
-            "initial_state": {
-                "1": rods[1],
-                "2": rods[2],
-                "3": rods[3]
-            },
-            "target": target,
-            "total_moves": len(seq),
-            "moves_sequence": {str(k): v for k, v in seq.items()}
-        }
-        existing_data["solutions"][str(next_number)] = solution_data
-        json_str = _format_json_mixed(existing_data, indent = 2)
-        with open(file, "w") as f:
-            f.write(json_str)
-        print(f"✅ Solution saved as #{next_number} to {file}!")
+        number, = _save_solutions([(rods, target, seq)], file)
+        print(f"✅ Solution saved as #{number} to {file}!")
+        _count_saved("save_solution", file, size_before, 1)
         return True
     except Exception as e:
         print(f"❌ Failed to save solution: {e}!")
         return False
 
+@instrumentation.stage("save_solutions")
+def save_solutions(solutions, file = "solutions.json", recipe = False):
+    """
+    Save several solutions at once, reading and writing the file a single time, with consecutive numbers given in order
+    Input:
+        - solutions: a list of (rods, target, seq) tuples, in the forms taken by save_solution
+        - file: the JSON file's name to save the solutions to (or an SQLite store, see solution_store.SolutionStore,
+          if it ends with .db or .sqlite)
+        - recipe: whether to store only the recipes of the solutions, as in save_solution
+    Output:
+        - the list of numbers given to the saved solutions, or None if they could not be saved
+    """
+    if recipe:
+        solutions = [(rods, target, as_recipe(rods, target, seq)) for rods, target, seq in solutions]
+        if any(seq is None for rods, target, seq in solutions):
+            return None
+    try:
+        size_before = _stored_size(file)
+        numbers = _save_solutions(solutions, file)
+        _count_saved("save_solutions", file, size_before, len(numbers))
+        if numbers:
+            print(f"✅ {len(numbers)} solution(s) saved as #{numbers[0]}-#{numbers[-1]} to {file}!")
+        return numbers
+    except Exception as e:
+        print(f"❌ Failed to save solutions: {e}!")
+        return None
+
+def as_recipe(rods, target, seq = None):
+    '''
+    Input:
+        - rods: a dictionary, in the form {1: <list>, 2: <list>, 3: <list>}
+        - target: the number of the target rod
+        - seq: the moves sequence to check against the solver, in the forms taken by save_solution (None to skip the check)
+    Output:
+        - the calculate_solution.SolutionRecipe of the optimal solution of the problem, or None if seq is not that solution
+    '''
+    if isinstance(seq, SolutionRecipe):
+        return seq
+    recipe = SolutionRecipe(rods, target)
+    try:
+        is_solver_sequence = seq is None or sequence_checksum(seq) == recipe.checksum
+    except ValueError:
+        # Moves that cannot be packed are not the solver's
+        is_solver_sequence = False
+    if not is_solver_sequence:
+        print("❌ The moves sequence is not the optimal solution of the problem, it cannot be saved as a recipe!")
+        return None
+    return recipe
+
+def _stored_size(file):
+    '''
+    Output:
+        - the size in bytes of the part of the file that is kept when saving to it (only SQLite stores are appended to,
+          JSON and binary files are written entirely), or None when the instrumentation is disabled
+    '''
+    if not instrumentation.is_enabled():
+        return None
+    if file.endswith(STORE_EXTENSIONS) and os.path.exists(file):
+        return os.path.getsize(file)
+    return 0
+
+def _count_saved(name, file, size_before, solutions):
+    if size_before is not None and os.path.exists(file):
+        instrumentation.count(name, solutions = solutions, bytes_written = os.path.getsize(file) - size_before)
+
+def _save_solutions(solutions, file):
+    if file.endswith(BINARY_EXTENSION):
+        raise ValueError(f"a binary file holds a single solution, use save_solution for {file}")
+    if file.endswith(STORE_EXTENSIONS):
+        with SolutionStore(file) as store:
+            return store.extend(solutions)
+    # The solutions are written to a temporary file that replaces the file once complete, so that a failure while
+    # saving leaves the file as it was
+    directory = os.path.dirname(os.path.abspath(file))
+    fd, temp_file = tempfile.mkstemp(prefix = os.path.basename(file) + ".", suffix = ".tmp", dir = directory)
+    try:
+        with open(fd, "w") as out:
+            try:
+                with open(file, "r") as f:
+                    numbers = _write_solutions_json(out, _JsonReader(f), solutions)
+                _copy_mode(file, temp_file)
+            except (FileNotFoundError, json.JSONDecodeError):
+                out.seek(0)
+                out.truncate()
+                numbers = _write_solutions_json(out, None, solutions)
+                _copy_mode(None, temp_file)
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(temp_file, file)
+    except BaseException:
+        os.remove(temp_file)
+        raise
+    return numbers
+
+def _copy_mode(file, temp_file):
+    '''
+    Give the temporary file the permissions of the file it replaces, or the default ones of a new file if file is None
+    (mkstemp creates files readable by their owner only).
+    '''
+    if file is not None:
+        os.chmod(temp_file, os.stat(file).st_mode & 0o7777)
+    else:
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(temp_file, 0o666 & ~umask)
+
+def _write_solutions_json(out, reader, solutions, indent = 2):
+    '''
+    Write the JSON file made of the existing data (copied from `reader`, see _JsonReader) and the new solutions, in
+    the layout of `_format_json_mixed`, with the solutions numbered after the existing ones.
+    Input:
+        - out: the open file to write to
+        - reader: a _JsonReader on the existing data, or None if there is none
+        - solutions: a list of (rods, target, seq) tuples, in the forms taken by save_solution
+    Output:
+        - the list of numbers given to the new solutions
+    '''
+    pad = " " * indent
+    out.write("{\n")
+    is_first = True
+    numbers = None
+    if reader is not None:
+        if reader.is_at_end():
+            # An empty file is invalid JSON, which _save_solutions replaces with a new file
+            raise json.JSONDecodeError("Expecting value", "", 0)
+        if not reader.is_object():
+            raise ValueError("the existing data is not a JSON object")
+        for key in reader.members():
+            out.write("" if is_first else ",\n")
+            out.write(f"{pad}{json.dumps(key)}: ")
+            is_first = False
+            if key == "solutions" and numbers is None:
+                if not reader.is_object():
+                    raise ValueError("the existing solutions are not a JSON object")
+                numbers = _write_solutions_members(out, reader, solutions, indent)
+            else:
+                _write_json_mixed(out, reader, indent, 1)
+    if numbers is None:
+        out.write("" if is_first else ",\n")
+        out.write(f'{pad}"solutions": ')
+        numbers = _write_solutions_members(out, None, solutions, indent)
+    out.write("\n}")
+    return numbers
+
+def _write_solutions_members(out, reader, solutions, indent = 2):
+    pad = " " * (indent * 2)
+    is_empty = True
+    next_number = 1
+    if reader is not None:
+        for num in reader.members():
+            out.write("{\n" if is_empty else ",\n")
+            out.write(f"{pad}{json.dumps(num)}: ")
+            _write_json_mixed(out, reader, indent, 2)
+            is_empty = False
+            if str(num).isdigit():
+                next_number = max(next_number, int(num) + 1)
+    numbers = []
+    for i, (rods, target, seq) in enumerate(solutions):
+        out.write("{\n" if is_empty else ",\n")
+        out.write(f'{pad}"{next_number + i}": ')
+        _write_solution_mixed(out, rods, target, seq, indent, 2)
+        is_empty = False
+        numbers.append(next_number + i)
+    out.write("{}" if is_empty else "\n" + " " * indent + "}")
+    return numbers
+
+def _write_solution_mixed(out, rods, target, seq, indent = 2, level = 0):
+    '''
+    Write a new solution in the layout of `_format_json_mixed`, streaming its moves (a sequence without a length,
+    e.g. a generator, is spooled to a temporary file first to count its moves).
+    '''
+    solution_data = {
+        "timestamp": datetime.now().isoformat(),
+        "initial_state": {
+            "1": rods[1],
+            "2": rods[2],
+            "3": rods[3]
+        },
+        "target": target
+    }
+    if isinstance(seq, SolutionRecipe):
+        solution_data["total_moves"] = len(seq)
+        solution_data["moves_recipe"] = seq.to_json()
+        out.write(_format_json_mixed(solution_data, indent, level))
+        return
+    with ExitStack() as spools:
+        if hasattr(seq, "__len__"):
+            total_moves, moves = len(seq), iter_moves(seq)
+        else:
+            spool = spools.enter_context(tempfile.TemporaryFile("w+"))
+            total_moves = 0
+            for r, x, y in iter_moves(seq):
+                spool.write(f"{r} {x} {y}\n")
+                total_moves += 1
+            spool.seek(0)
+            moves = (line.split() for line in spool)
+        solution_data["total_moves"] = total_moves
+        head = _format_json_mixed(solution_data, indent, level)
+        # The moves sequence is the last member, written in place of the closing brace of the other ones
+        out.write(head[:head.rindex("\n")] + ",\n" + " " * (indent * (level + 1)) + '"moves_sequence": ')
+        _write_moves_mixed(out, moves, total_moves, indent, level + 1)
+        out.write("\n" + " " * (indent * level) + "}")
+
+@instrumentation.stage("load_solution")
 def load_solution(file = "solutions.json", sol_num = 1):
     """
     Load a specific solution from JSON file
     Input:
-        - file: the JSON file's name to load the solution from
-        - sol_num: the number of the solution to load
+        - file: the JSON file's name to load the solution from (or a binary file, see binary_solution.BinarySolution,
+          if its name ends with .hnb, or an SQLite store, see solution_store.SolutionStore, if it ends with .db or .sqlite)
+        - sol_num: the number of the solution to load (a binary file holds a single solution, so it is ignored)
     Output:
         - initial_state: a dictionary, in the form {1: <list>, 2: <list>, 3: <list>}
             - 1: the initial state of the first (left) rod, represented as a list of rings ordered from bottom to top
@@ -168,27 +900,61 @@ def load_solution(file = "solutions.json", sol_num = 1):
             - r: the number of the ring that moves during the transition of move m
             - x: the number of the rod from which the transition of move m starts
             - y: the number of the rod to which the transition of move m ends
+          kept as a binary_solution.MoveSequence (a memory-mapped binary_solution.BinarySolution for binary files, and a
+          calculate_solution.SolutionRecipe for the solutions saved as recipes, which generates the moves when they
+          are read, all giving the same seq[m] access)
     """
     try:
+        if file.endswith(BINARY_EXTENSION):
+            seq = BinarySolution(file)
+            print(f"✅ Loaded solution from {file}")
+            print(f"Total moves: {len(seq)}")
+            return seq.initial_state, seq.target, seq
+        if file.endswith(STORE_EXTENSIONS):
+            with SolutionStore(file) as store:
+                solution = store.get(int(sol_num))
+                if solution is None:
+                    print(f"❌ Solution #{sol_num} not found!")
+                    print(f"Available solutions: {', '.join(str(num) for num in store.numbers())}")
+                    return None, None, None
+            initial_state, target, seq, timestamp = solution
+            print(f"✅ Loaded solution #{sol_num} from {file}")
+            print(f"Timestamp: {timestamp}")
+            print(f"Total moves: {len(seq)}")
+            return initial_state, target, seq
+        # The file is read incrementally, skipping the other solutions without decoding their moves
         with open(file, "r") as f:
-            data = json.load(f)
-        if "solutions" not in data:
-            print(f"❌ No solutions found in {file}!")
-            return None, None, None
-        solutions = data["solutions"]
-        if str(sol_num) not in solutions:
-            available_solutions = [num for num in solutions.keys() if num.isdigit()]
+            reader = _JsonReader(f)
+            if not reader.find("solutions"):
+                print(f"❌ No solutions found in {file}!")
+                return None, None, None
+            solution = None
+            available_solutions = []
+            for num in reader.members():
+                if num == str(sol_num):
+                    solution = _read_solution(reader)
+                    break
+                if num.isdigit():
+                    available_solutions.append(num)
+                reader.skip()
+        if solution is None:
             print(f"❌ Solution #{sol_num} not found!")
             print(f"Available solutions: {', '.join(sorted(available_solutions))}")
             return None, None, None
-        solution = solutions[str(sol_num)]
         initial_state = {
             1: solution["initial_state"]["1"],
             2: solution["initial_state"]["2"], 
             3: solution["initial_state"]["3"]
         }
         target = solution["target"]
-        seq = solution["moves_sequence"]
+        recipe = solution.get("moves_recipe")
+        if recipe is not None:
+            if recipe["version"] != SOLVER_VERSION:
+                print(f"❌ Solution #{sol_num} was made by the solver version {recipe['version']}, the current one is {SOLVER_VERSION}!")
+                return None, None, None
+            seq = SolutionRecipe(initial_state, target, recipe["checksum"], recipe["version"], solution.get("total_moves"))
+        else:
+            seq = solution["moves_sequence"]
         print(f"✅ Loaded solution #{sol_num} from {file}")
         print(f"Timestamp: {solution.get('timestamp', 'Unknown')}")
         print(f"Total moves: {solution.get('total_moves', len(seq))}")
@@ -206,43 +972,67 @@ def load_solution(file = "solutions.json", sol_num = 1):
         print(f"❌ Failed to load solution: {e}!")
         return None, None, None
 
+@instrumentation.stage("simplify_sequence")
 def simplify_sequence(seq):
     '''
     Simplify the moves sequence, reducing the number of moves and keeping the solution valid.
         - test 1: check for consecutive moves done with the same ring, and substitute them with the corresponding single effective move
         - test 2: check if moves in the form {m: [r, z, z]} (same start and final rods) are left in the sequence
+    Both tests are applied in a single pass over the sequence by iter_simplify_sequence, so the cost is O(len(seq)).
     Input:
-        - seq: a dictionary, in the form {m1: [r1, x1, y1], m2: [r2, x2, y2], ...}
+        - seq: a dictionary, in the form {m1: [r1, x1, y1], m2: [r2, x2, y2], ...}, a binary_solution.MoveSequence, or a list, array or iterable of [r, x, y] moves
             - m: the number of the move
             - r: the number of the ring that moves during the transition of move m
             - x: the number of the rod from which the transition of move m starts
             - y: the number of the rod to which the transition of move m ends
     Output:
-        - simple_seq: the simplified sequence, in the same form as the seq
-    '''
-    if not seq:
-        return {}
-    moves = []
-    for move_num in sorted(seq.keys()):
-        ring, source, dest = seq[move_num]
-        moves.append((ring, source, dest))
-    changed = True
-    while changed:
-        changed = False
-        k = 0
-        while k < len(moves) - 1:
-            current_move = moves[k]
-            next_move = moves[k + 1]
-            if current_move[0] == next_move[0]:
-                moves[k] = (current_move[0], current_move[1], next_move[2])
-                del moves[k+1]
-                changed = True
-                current_move = moves[k]
-                if current_move[1] == current_move[2]:
-                    del moves[k]
-            else:
-                k += 1
-    simple_seq = {}
-    for m, (ring, source, dest) in enumerate(moves):
-        simple_seq[m + 1] = [ring, source, dest]    
+        - simple_seq: the simplified sequence, in the form of a dictionary {m1: [r1, x1, y1], m2: [r2, x2, y2], ...}
+          (a binary_solution.MoveSequence if seq is one)
+    '''
+    moves = seq
+    if isinstance(seq, dict):
+        moves = (seq[move_num] for move_num in sorted(seq.keys()))
+    if isinstance(seq, MoveSequence):
+        simple_seq = MoveSequence(iter_simplify_sequence(moves))
+    else:
+        simple_seq = {}
+        for m, (ring, source, dest) in enumerate(iter_simplify_sequence(moves), 1):
+            simple_seq[m] = [ring, source, dest]
+    if instrumentation.is_enabled() and hasattr(seq, "__len__"):
+        instrumentation.count("simplify_sequence", moves = len(seq), moves_merged = len(seq) - len(simple_seq))
     return simple_seq
+
+def iter_moves(seq):
+    '''
+    Input:
+        - seq: a dictionary, in the form {m1: [r1, x1, y1], m2: [r2, x2, y2], ...}, a binary_solution.MoveSequence, or an iterable of [r, x, y] moves
+    Output:
+        - an iterator over the (r, x, y) moves of the sequence, in the order they are played
+    '''
+    if isinstance(seq, dict):
+        return map(seq.__getitem__, range(1, len(seq) + 1))
+    return iter(seq)
+
+def iter_simplify_sequence(moves, window = None):
+    '''
+    Streaming version of simplify_sequence: the moves are merged on a stack of pending moves while they are read.
+        - a move done with the same ring as the move on top of the stack is merged with it into the corresponding single effective move
+        - a merged move in the form (r, z, z) (same start and final rods) is dropped, which exposes the previous move for further merging
+    Input:
+        - moves: an iterable of (r, x, y) moves
+        - window: the maximum number of pending moves kept on the stack (None for no limit); the oldest pending moves are emitted
+          once the limit is exceeded, so the memory stays bounded and the sequence stays valid, but cancellations deeper than
+          the window are not found
+    Output:
+        - a generator of the (r, x, y) moves of the simplified sequence
+    '''
+    stack = deque()
+    for ring, source, dest in moves:
+        if stack and stack[-1][0] == ring:
+            source = stack.pop()[1]
+            if source == dest:
+                continue
+        stack.append((ring, source, dest))
+        if window is not None and len(stack) > window:
+            yield stack.popleft()
+    yield from stack